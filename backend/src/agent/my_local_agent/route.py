@@ -1,11 +1,15 @@
+import asyncio
 import json
 import logging.config
 from contextlib import asynccontextmanager
 import os
 from typing import Any, AsyncGenerator, Dict, List
 
+import httpx
+import orjson
+
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from ollama import AsyncClient
 from openinference.semconv.trace import SpanAttributes
 from opentelemetry import trace
@@ -36,14 +40,49 @@ tracer = trace.get_tracer(__name__)
 tool_registry = MyLocalAgentToolRegistry.create_registry()
 logger.info(f"Tool registry initialized with {len(tool_registry.tools)} tools")
 
+# Per-model chat options, built once: (tool functions offered, thinking effort)
+# Todo extract this into a config file
+MODEL_CONFIG = {
+    "gpt-oss:20b": ([tool.function for tool in tool_registry.tools.values()], "low"),
+}
+
+
+# Prebuilt framing for the per-token events; only the text needs encoding.
+# Gives the same bytes as encode_event on the equivalent dict
+THINKING_EVENT_PREFIX = b'{"stage":"thinking","response":'
+CONTENT_EVENT_PREFIX = b'{"stage":"content","response":'
+TEXT_EVENT_SUFFIX = b"}\n"
+
+
+def encode_event(event: Dict[str, Any]) -> bytes:
+    """Serialize one stream event as a newline-terminated JSON line."""
+    # Non-str keys are stringified as json.dumps did, e.g. in tool results
+    return orjson.dumps(
+        event, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS
+    )
+
 
 def print_trace(ex: BaseException):
     print("".join(traceback.TracebackException.from_exception(ex).format()))
 
 
+# Connection pool for the Ollama client. The tool loop sends several chat
+# requests per query, so idle connections are kept long enough to be reused
+# across turns and follow-up messages instead of reconnecting each time
+OLLAMA_POOL_LIMITS = httpx.Limits(
+    max_keepalive_connections=40, max_connections=100, keepalive_expiry=30.0
+)
+
 # Initialize Ollama client
 try:
-    ollama_client = AsyncClient(host=os.environ["OLLAMA_URL"])
+    ollama_client = AsyncClient(
+        host=os.environ["OLLAMA_URL"],
+        # Limits go on the transport; httpx ignores client-level limits
+        # once a transport is given
+        transport=httpx.AsyncHTTPTransport(limits=OLLAMA_POOL_LIMITS, retries=3),
+        # ollama defaults to no timeout; long generations still fit in 300 s
+        timeout=300.0,
+    )
 except Exception as e:
     print(f"FAIL Ollama client initialization error: {e}")
     logger.error(f"Failed to initialize Ollama client: {e}")
@@ -87,7 +126,12 @@ async def get_conversation(
     print("==========================================================================")
     conv_manager = ConversationManager.load_existing(conversation_id)
     if conv_manager:
-        return conv_manager.get_current_conversation()
+        # Serialized by the generated to_json; response_model still documents
+        # the shape, but FastAPI skips re-validating a returned Response
+        return Response(
+            conv_manager.get_current_conversation().to_json(),
+            media_type="application/json",
+        )
     else:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
@@ -241,6 +285,89 @@ async def _stream_model_response(  # noqa: C901
             raise
 
 
+async def _run_tool_call(tool_call: Dict[str, Any]) -> Dict[str, Any] | None:
+    """
+    Executes one tool call.
+
+    The tool itself runs in a worker thread so that several calls from the
+    same turn can overlap. The caller persists the result.
+
+    Args:
+        tool_call: A tool call received from the model.
+
+    Returns:
+        The tool result or tool error event, or None if the call has no name.
+    """
+    tool_name = tool_call.get("function", {}).get("name")
+    with tracer.start_as_current_span(
+        name=tool_name,
+        attributes={SpanAttributes.OPENINFERENCE_SPAN_KIND: "TOOL"},
+    ) as tool_span:
+        try:
+            if not tool_name:
+                print(f"FAIL Tool call missing name: {tool_call}")
+                logger.warning(f"Tool call missing name: {tool_call}")
+                return None
+
+            tool_span.set_attribute("tool.name", tool_name)
+
+            # Check if tool exists in registry first
+            tool = tool_registry.get_tool_by_function_name(tool_name)
+            if tool:
+                print(f"Found tool in registry: {tool_name}")
+                # Enhanced tracing with tool metadata
+                tool_span.set_attribute("tool.version", tool.current_version)
+                tool_span.set_attribute("tool.category", tool.category)
+                tool_span.set_attribute("tool.status", tool.status.value)
+                tool_span.set_attribute("tool.call_count", tool.call_count)
+
+                args = tool_call.get("function", {}).get("arguments", {})
+                tool_span.set_attribute("tool.arguments", json.dumps(args))
+                print(
+                    f"Executing tool '{tool_name}'",
+                    f"v{tool.current_version} ",
+                    f"with args: {args}",
+                )
+
+                # Execute through registry for enhanced tracking
+                result = await asyncio.to_thread(
+                    tool_registry.execute_tool_by_function_name, tool_name, **args
+                )
+
+                # Add enhanced metrics
+                tool_span.set_attribute("tool.result", str(result))
+                tool_span.set_attribute(
+                    "tool.average_execution_time_ms",
+                    tool.average_execution_time_ms,
+                )
+            else:
+                print(f"Tool '{tool_name}' not found in registry.")
+                # Tool not found in registry
+                error_msg = f"Tool '{tool_name}' not found in registry."
+                print(f"FAIL {error_msg}")
+                logger.error(error_msg)
+                raise ValueError(error_msg)
+
+            return {
+                "stage": "tool_result",
+                "tool": tool_name,
+                "args": args,
+                "result": result,
+            }
+
+        except Exception as e:
+            tool_span.record_exception(e)
+            tool_span.set_status(Status(StatusCode.ERROR, str(e)))
+            error_msg = f"Tool execution error for '{tool_name}': {e}"
+            print(f"FAIL {error_msg}")
+            logger.error(error_msg)
+            return {
+                "stage": "tool_error",
+                "tool": tool_name,
+                "error": str(e),
+            }
+
+
 async def _execute_tools(
     tool_calls: List[Dict[str, Any]],
     conv_manager: ConversationManager,
@@ -248,7 +375,11 @@ async def _execute_tools(
     """
     Executes a list of tool calls and yields their results.
 
-    This function uses the ConversationManager to persist tool results.
+    The calls run concurrently and results are yielded as each one finishes,
+    so a turn takes as long as its slowest tool rather than the sum of all.
+    Once all have finished, the results are persisted through the
+    ConversationManager in the order the model emitted the calls, which is
+    the order they are replayed to it on the next turn.
 
     Args:
         tool_calls: A list of tool calls received from the model.
@@ -262,85 +393,28 @@ async def _execute_tools(
         kind=SpanKind.INTERNAL,
         attributes={SpanAttributes.OPENINFERENCE_SPAN_KIND: "CHAIN"},
     ) as outer_span:
+        pending = []
         try:
-            for tool_call in tool_calls:
-                tool_name = tool_call.get("function", {}).get("name")
-                with tracer.start_as_current_span(
-                    name=tool_name,
-                    attributes={SpanAttributes.OPENINFERENCE_SPAN_KIND: "TOOL"},
-                ) as tool_span:
-                    try:
-                        if not tool_name:
-                            print(f"FAIL Tool call missing name: {tool_call}")
-                            logger.warning(f"Tool call missing name: {tool_call}")
-                            continue
-
-                        tool_span.set_attribute("tool.name", tool_name)
-
-                        # Check if tool exists in registry first
-                        tool = tool_registry.get_tool_by_function_name(tool_name)
-                        if tool:
-                            print(f"Found tool in registry: {tool_name}")
-                            # Enhanced tracing with tool metadata
-                            tool_span.set_attribute(
-                                "tool.version", tool.current_version
-                            )
-                            tool_span.set_attribute("tool.category", tool.category)
-                            tool_span.set_attribute("tool.status", tool.status.value)
-                            tool_span.set_attribute("tool.call_count", tool.call_count)
-
-                            args = tool_call.get("function", {}).get("arguments", {})
-                            tool_span.set_attribute("tool.arguments", json.dumps(args))
-                            print(
-                                f"Executing tool '{tool_name}'",
-                                f"v{tool.current_version} ",
-                                f"with args: {args}",
-                            )
-
-                            # Execute through registry for enhanced tracking
-                            result = tool_registry.execute_tool_by_function_name(
-                                tool_name, **args
-                            )
-
-                            # Add enhanced metrics
-                            tool_span.set_attribute("tool.result", str(result))
-                            tool_span.set_attribute(
-                                "tool.average_execution_time_ms",
-                                tool.average_execution_time_ms,
-                            )
-                        else:
-                            print(f"Tool '{tool_name}' not found in registry.")
-                            # Tool not found in registry
-                            error_msg = f"Tool '{tool_name}' not found in registry."
-                            print(f"FAIL {error_msg}")
-                            logger.error(error_msg)
-                            raise ValueError(error_msg)
-                        # Save tool result using the conversation manager
-                        conv_manager.add_tool_message(
-                            content=str(result),
-                            tool_name=tool_name,
-                            model=conv_manager.get_current_conversation().model,
-                        )
-
-                        # Yield the result to the client
-                        yield {
-                            "stage": "tool_result",
-                            "tool": tool_name,
-                            "args": args,
-                            "result": result,
-                        }
-
-                    except Exception as e:
-                        tool_span.record_exception(e)
-                        tool_span.set_status(Status(StatusCode.ERROR, str(e)))
-                        error_msg = f"Tool execution error for '{tool_name}': {e}"
-                        print(f"FAIL {error_msg}")
-                        logger.error(error_msg)
-                        yield {
-                            "stage": "tool_error",
-                            "tool": tool_name,
-                            "error": str(e),
-                        }
+            pending = [
+                asyncio.ensure_future(_run_tool_call(tool_call))
+                for tool_call in tool_calls
+            ]
+            for next_done in asyncio.as_completed(pending):
+                event = await next_done
+                if event is not None:
+                    # Yield the result to the client
+                    yield event
+
+            # Save tool results using the conversation manager
+            model_name = conv_manager.get_current_conversation().model
+            for task in pending:
+                event = task.result()
+                if event is not None and event["stage"] == "tool_result":
+                    conv_manager.add_tool_message(
+                        content=str(event["result"]),
+                        tool_name=event["tool"],
+                        model=model_name,
+                    )
         except Exception as e:
             outer_span.record_exception(e)
             outer_span.set_status(Status(StatusCode.ERROR, str(e)))
@@ -351,6 +425,10 @@ async def _execute_tools(
                 "stage": "error",
                 "response": f"Tool execution system error: {str(e)}",
             }
+        finally:
+            # Nothing keeps running if the client goes away mid-turn
+            for task in pending:
+                task.cancel()
 
 
 # @tracer.start_as_current_span(
@@ -378,23 +456,18 @@ async def _stream_chat_with_tools_refactored(  # noqa: C901
     ) as span:
 
         # Model-specific setup
-        # Todo extract this into a config file
-        available_tools: List[Any] | None = None
-        thinking_effort = None
-        if model in ["gpt-oss:20b"]:
-            available_tools = [tool.function for tool in tool_registry.tools.values()]
-            thinking_effort = "low"
+        available_tools, thinking_effort = MODEL_CONFIG.get(model, (None, None))
 
         tools_count = len(available_tools) if available_tools else 0
         print(f"Starting chat stream with model: {model}, tools: {tools_count}")
         logger.info(f"Starting chat stream with model: {model}")
 
-        yield json.dumps(
+        yield encode_event(
             {
                 "stage": "metadata",
                 "conversation_id": conv_manager.get_current_conversation().id,
             }
-        ) + "\n"
+        )
 
         count = 0
         while True:
@@ -420,11 +493,21 @@ async def _stream_chat_with_tools_refactored(  # noqa: C901
                     async for chunk in streamer:
                         stage = chunk.get("stage")
                         if stage == "thinking":
-                            full_thinking.append(chunk["response"])
-                            yield json.dumps(chunk) + "\n"
+                            text = chunk["response"]
+                            full_thinking.append(text)
+                            yield (
+                                THINKING_EVENT_PREFIX
+                                + orjson.dumps(text)
+                                + TEXT_EVENT_SUFFIX
+                            )
                         elif stage == "content":
-                            full_content.append(chunk["response"])
-                            yield json.dumps(chunk) + "\n"
+                            text = chunk["response"]
+                            full_content.append(text)
+                            yield (
+                                CONTENT_EVENT_PREFIX
+                                + orjson.dumps(text)
+                                + TEXT_EVENT_SUFFIX
+                            )
                         elif stage == "tool_call_chunk":
                             tool_calls_this_turn.append(chunk["tool_call"])
                 except Exception as e:
@@ -444,7 +527,7 @@ async def _stream_chat_with_tools_refactored(  # noqa: C901
 
                 # === Part 2: Check for tool calls and execute them ===
                 if not tool_calls_this_turn:
-                    yield json.dumps({"stage": "finalize_answer"}) + "\n"
+                    yield encode_event({"stage": "finalize_answer"})
                     break  # No tools to call, so we're done.
 
                 print(f"Executing {len(tool_calls_this_turn)} tool call(s)")
@@ -455,7 +538,7 @@ async def _stream_chat_with_tools_refactored(  # noqa: C901
                 )
 
                 async for tool_result in tool_executor:
-                    yield json.dumps(tool_result) + "\n"
+                    yield encode_event(tool_result)
 
                 # Loop continues to the next turn with the updated messages list...
             except Exception as e:
@@ -469,7 +552,7 @@ async def _stream_chat_with_tools_refactored(  # noqa: C901
                     "stage": "error",
                     "response": f"Chat loop error: {str(e)}",
                 }
-                yield json.dumps(error_response) + "\n"
+                yield encode_event(error_response)
                 raise
 
 
@@ -535,6 +618,6 @@ async def invoke(
                 "response": f"Response creation error: {str(e)}",
             }
             return StreamingResponse(
-                iter([json.dumps(error_response) + "\n"]),
+                iter([encode_event(error_response)]),
                 media_type="text/plain",
             )
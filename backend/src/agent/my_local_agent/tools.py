@@ -22,6 +22,7 @@ class MyLocalAgentToolRegistry:
                 tags=["weather", "temperature", "city"],
                 author="LocalAgent Team",
                 current_version="1.0.0",
+                cache_ttl_seconds=300,
             ),
             Tool(
                 name="get_weather_conditions",
@@ -31,6 +32,7 @@ class MyLocalAgentToolRegistry:
                 tags=["weather", "conditions", "city"],
                 author="LocalAgent Team",
                 current_version="1.0.0",
+                cache_ttl_seconds=60,
             ),
         ]
 
@@ -109,26 +109,26 @@ class ConversationManager:
 
         conversation = Conversation(
             id=conversation_id,
-            created_at=conversation_data.get("timestamp"),
-            updated_at=conversation_data.get("timestamp"),
-            title=conversation_data.get("title"),
-            model_name=conversation_data.get("model_name"),
-            system_prompt=conversation_data.get("system_prompt"),
-            temperature=conversation_data.get("temperature", 0.7),
-            max_tokens=conversation_data.get("max_tokens"),
+            created_at=conversation_data["timestamp"],
+            updated_at=conversation_data["timestamp"],
+            title=conversation_data["title"],
+            model_name=conversation_data["model_name"],
+            system_prompt=conversation_data["system_prompt"],
+            temperature=conversation_data["temperature"],
+            max_tokens=conversation_data["max_tokens"],
             metadata=(
-                json.loads(conversation_data.get("metadata", "{}"))
-                if conversation_data.get("metadata")
+                json.loads(conversation_data["metadata"])
+                if conversation_data["metadata"]
                 else {}
             ),
-            uuid=conversation_data.get("uuid"),
+            uuid=conversation_data["uuid"],
         )
 
         with DatabaseManager() as db:
             messages_data = db.get_messages(conversation_id)
         for msg_data in messages_data:
             tool_calls = None
-            if msg_data.get("tool_calls"):
+            if msg_data["tool_calls"]:
                 try:
                     tool_calls = json.loads(msg_data["tool_calls"])
                 except json.JSONDecodeError:
@@ -137,22 +137,20 @@ class ConversationManager:
                 id=msg_data["id"],
                 role=Role(msg_data["role"]),
                 content=msg_data["content"],
-                timestamp=msg_data.get("timestamp", datetime.now()),
-                thinking=msg_data.get("thinking"),
+                timestamp=msg_data["timestamp"],
+                thinking=msg_data["thinking"],
                 tool_calls=tool_calls,
-                tool_name=msg_data.get("tool_name"),
-                model=msg_data.get("model"),
+                tool_name=msg_data["tool_name"],
+                model=msg_data["model"],
                 # New Phase 1 fields
-                confidence_score=msg_data.get("confidence_score"),
-                token_count=msg_data.get("token_count"),
-                processing_time_ms=msg_data.get("processing_time_ms"),
+                confidence_score=msg_data["confidence_score"],
+                token_count=msg_data["token_count"],
+                processing_time_ms=msg_data["processing_time_ms"],
                 metadata=(
-                    json.loads(msg_data.get("metadata", "{}"))
-                    if msg_data.get("metadata")
-                    else None
+                    json.loads(msg_data["metadata"]) if msg_data["metadata"] else None
                 ),
-                parent_message_id=msg_data.get("parent_message_id"),
-                uuid=msg_data.get("uuid"),
+                parent_message_id=msg_data["parent_message_id"],
+                uuid=msg_data["uuid"],
             )
             conversation.messages.append(message)
 
@@ -392,19 +390,19 @@ class ConversationManager:
         # Create conversation object
         conversation = Conversation(
             id=conversation_id,
-            created_at=conversation_data.get("timestamp"),
-            updated_at=conversation_data.get("timestamp"),
-            title=conversation_data.get("title"),
-            model_name=conversation_data.get("model_name"),
-            system_prompt=conversation_data.get("system_prompt"),
-            temperature=conversation_data.get("temperature", 0.7),
-            max_tokens=conversation_data.get("max_tokens"),
+            created_at=conversation_data["timestamp"],
+            updated_at=conversation_data["timestamp"],
+            title=conversation_data["title"],
+            model_name=conversation_data["model_name"],
+            system_prompt=conversation_data["system_prompt"],
+            temperature=conversation_data["temperature"],
+            max_tokens=conversation_data["max_tokens"],
             metadata=(
-                json.loads(conversation_data.get("metadata", "{}"))
-                if conversation_data.get("metadata")
+                json.loads(conversation_data["metadata"])
+                if conversation_data["metadata"]
                 else {}
             ),
-            uuid=conversation_data.get("uuid"),
+            uuid=conversation_data["uuid"],
         )
 
         # Load messages
@@ -412,7 +410,7 @@ class ConversationManager:
             messages_data = db.get_messages(conversation_id)
         for msg_data in messages_data:
             tool_calls = None
-            if msg_data.get("tool_calls"):
+            if msg_data["tool_calls"]:
                 try:
                     tool_calls = json.loads(msg_data["tool_calls"])
                 except json.JSONDecodeError:
@@ -421,22 +419,20 @@ class ConversationManager:
                 id=msg_data["id"],
                 role=Role(msg_data["role"]),
                 content=msg_data["content"],
-                timestamp=msg_data.get("timestamp", datetime.now()),
-                thinking=msg_data.get("thinking"),
+                timestamp=msg_data["timestamp"],
+                thinking=msg_data["thinking"],
                 tool_calls=tool_calls,
-                tool_name=msg_data.get("tool_name"),
-                model=msg_data.get("model"),
+                tool_name=msg_data["tool_name"],
+                model=msg_data["model"],
                 # New Phase 1 fields
-                confidence_score=msg_data.get("confidence_score"),
-                token_count=msg_data.get("token_count"),
-                processing_time_ms=msg_data.get("processing_time_ms"),
+                confidence_score=msg_data["confidence_score"],
+                token_count=msg_data["token_count"],
+                processing_time_ms=msg_data["processing_time_ms"],
                 metadata=(
-                    json.loads(msg_data.get("metadata", "{}"))
-                    if msg_data.get("metadata")
-                    else None
+                    json.loads(msg_data["metadata"]) if msg_data["metadata"] else None
                 ),
-                parent_message_id=msg_data.get("parent_message_id"),
-                uuid=msg_data.get("uuid"),
+                parent_message_id=msg_data["parent_message_id"],
+                uuid=msg_data["uuid"],
             )
             conversation.messages.append(message)
 
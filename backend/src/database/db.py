@@ -1,4 +1,9 @@
+import hashlib
 import os
+import random
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
 
 import sqlite3
@@ -52,12 +57,126 @@ default_db_file = get_default_db_file()
 ERROR_CONNECTION_MESSAGE = "Not connected to database. Call connect() first."
 
 
+class DisconnectedCursor:
+    """Stands in for the cursor while no connection is open."""
+
+    def execute(self, *args, **kwargs):
+        raise sqlite3.Error(ERROR_CONNECTION_MESSAGE)
+
+    executemany = execute
+
+
+# Every statement goes through the cursor, so while disconnected this raises
+# the connection error and the methods need no per-call "is None" check
+DISCONNECTED_CURSOR = DisconnectedCursor()
+
+# Hot-path statements, kept as constants so every call hands sqlite3 the same
+# text and hits its per-connection prepared statement cache
+INSERT_MESSAGE_SQL = """
+    INSERT INTO messages (
+        conversation_id,
+        step,
+        role,
+        content,
+        thinking,
+        tool_name,
+        tool_calls,
+        tool_results,
+        model,
+        confidence_score,
+        token_count,
+        processing_time_ms,
+        metadata,
+        parent_message_id,
+        uuid
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+SELECT_MESSAGES_SQL = """
+    SELECT *
+    FROM messages
+    WHERE conversation_id = ?
+    ORDER BY step ASC
+"""
+# Maintained by the message-count triggers, so reading it is one rowid lookup;
+# messages without a conversation row are counted directly, as COUNT(*) did
+COUNT_MESSAGES_SQL = """
+    SELECT COALESCE(
+        (SELECT message_count FROM conversations WHERE id = ?1),
+        (SELECT COUNT(*) FROM messages WHERE conversation_id = ?1)
+    )
+"""
+SELECT_MESSAGE_HEADERS_SQL = """
+    SELECT id, step, role, model, length(content) AS content_len, timestamp
+    FROM messages
+    WHERE conversation_id = ?
+    ORDER BY step ASC
+"""
+
+# Function named by an assistant message's first tool call, computed by SQLite
+# from the tool_calls JSON so it can be filtered and indexed without parsing
+# rows in Python; NULL when tool_calls is empty or not JSON
+TOOL_CALL_NAME_COLUMN = (
+    "TEXT GENERATED ALWAYS AS (CASE WHEN json_valid(tool_calls) "
+    "THEN json_extract(tool_calls, '$[0].function.name') END) VIRTUAL"
+)
+
+# Columns get_messages may project; names are interpolated into SQL, so only
+# these are accepted
+MESSAGE_COLUMNS = frozenset(
+    {
+        "id",
+        "conversation_id",
+        "step",
+        "role",
+        "content",
+        "thinking",
+        "tool_name",
+        "tool_calls",
+        "tool_results",
+        "model",
+        "timestamp",
+        "confidence_score",
+        "token_count",
+        "processing_time_ms",
+        "metadata",
+        "parent_message_id",
+        "uuid",
+        "tool_call_name",
+    }
+)
+
+
+class ThreadConnection(threading.local):
+    """The calling thread's connection and cursor for one DatabaseManager."""
+
+    conn = None
+    cursor = DISCONNECTED_CURSOR
+
+
 class DatabaseManager:
-    @tracer.start_as_current_span("database__init__", kind=trace.SpanKind.INTERNAL)
-    def __init__(self, db_file=default_db_file):
-        self.db_file = db_file
-        self.conn = None  # Connection object
-        self.cursor = None  # Cursor object
+    """
+    SQLite access with one connection and cursor per thread.
+
+    connect() opens a connection for the calling thread and marks the manager
+    connected; any other thread that then uses the manager gets a connection
+    of its own, opened and tuned on first use, so threads never share a
+    cursor. WAL lets those connections read while another writes. Every
+    connection is tracked, and close() closes them all.
+    """
+
+    # Only the public operations open spans; the low-level helpers run inside
+    # them, and SQLite3Instrumentor already traces every statement
+    def __init__(self, db_file=None, uri: bool | None = None):
+        # Resolve the module default at call time so it can be patched
+        self.db_file = db_file if db_file is not None else default_db_file
+        # Interpret db_file as a "file:" URI (e.g. shared memory); detected
+        # from the name unless given explicitly
+        self.uri = str(self.db_file).startswith("file:") if uri is None else uri
+        self.connected = False  # Between connect() and close()
+        self.thread_state = ThreadConnection()
+        self.connections = []  # Every open connection, across threads
+        self.connections_lock = threading.Lock()
 
     def __enter__(self):
         self.connect()
@@ -71,55 +190,121 @@ class DatabaseManager:
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
 
+    @property
+    def conn(self):
+        """The calling thread's connection, or None while disconnected."""
+        return self.thread_connection().conn
+
+    @property
+    def cursor(self):
+        """The calling thread's cursor; raises on use while disconnected."""
+        return self.thread_connection().cursor
+
+    def thread_connection(self) -> ThreadConnection:
+        """Returns this thread's state, opening its connection on first use."""
+        state = self.thread_state
+        if state.conn is None and self.connected:
+            try:
+                self.open_thread_connection()
+            except sqlite3.Error as e:
+                logger.error("Error connecting to database: %s", e)
+            state = self.thread_state
+        return state
+
+    def open_thread_connection(self):
+        """Opens and tunes a connection for the calling thread."""
+        # Autocommit mode: no implicit BEGIN before each statement;
+        # multi-statement writes open their own transactions
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=5.0,
+            check_same_thread=False,
+            uri=self.uri,
+            isolation_level=None,
+            cached_statements=256,
+        )
+        # Rows are C-level mapping views; no per-row dict is built
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        try:
+            # Improve concurrency and reliability
+            cursor.execute("PRAGMA journal_mode=WAL;")
+            cursor.execute("PRAGMA synchronous=NORMAL;")
+            cursor.execute("PRAGMA busy_timeout=5000;")
+            cursor.execute("PRAGMA foreign_keys=ON;")
+            # Keep temp tables in memory, 20 MB page cache, 256 MB mmap
+            cursor.execute("PRAGMA temp_store=MEMORY;")
+            cursor.execute("PRAGMA cache_size=-20000;")
+            cursor.execute("PRAGMA mmap_size=268435456;")
+        except Exception:
+            # Best-effort PRAGMA setup; continue even if not supported
+            pass
+        with self.connections_lock:
+            self.connections.append(conn)
+            state = self.thread_state
+            state.conn = conn
+            state.cursor = cursor
+        logger.info("Connected to database: %s", self.db_file)
+
     @tracer.start_as_current_span("connect_to_db", kind=trace.SpanKind.INTERNAL)
     def connect(self):
         try:
-            self.conn = sqlite3.connect(
-                self.db_file,
-                timeout=5.0,
-                check_same_thread=False,
-            )
-            self.cursor = self.conn.cursor()
-            try:
-                # Improve concurrency and reliability
-                self.cursor.execute("PRAGMA journal_mode=WAL;")
-                self.cursor.execute("PRAGMA synchronous=NORMAL;")
-                self.cursor.execute("PRAGMA busy_timeout=5000;")
-                self.cursor.execute("PRAGMA foreign_keys=ON;")
-            except Exception:
-                # Best-effort PRAGMA setup; continue even if not supported
-                pass
-            logger.info("Connected to database: %s", self.db_file)
+            if self.thread_state.conn is None:
+                self.open_thread_connection()
+            self.connected = True
         except sqlite3.Error as e:
             logger.error("Error connecting to database: %s", e)
 
     @tracer.start_as_current_span("close_db_connection", kind=trace.SpanKind.INTERNAL)
     def close(self):
-        if self.conn:
-            self.conn.close()
-            self.cursor = None  # Reset cursor to None
+        with self.connections_lock:
+            connections, self.connections = self.connections, []
+            self.connected = False
+            # A fresh thread-local drops every thread's closed connection
+            self.thread_state = ThreadConnection()
+        for conn in connections:
+            try:
+                # Let SQLite refresh planner statistics this session found stale
+                conn.execute("PRAGMA optimize")
+            except sqlite3.Error as e:
+                logger.warning("PRAGMA optimize failed on close: %s", e)
+            conn.close()
+        if connections:
             logger.info("Database connection closed: %s", self.db_file)
 
-    @tracer.start_as_current_span("create_table", kind=trace.SpanKind.INTERNAL)
     def create_table(self, table_name: str, schema: str):
         """Creates a table with the given schema."""
         try:
-            if self.conn is None:
-                raise sqlite3.Error(ERROR_CONNECTION_MESSAGE)
             self.cursor.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({schema})")
             logger.info("Table created: %s", table_name)
         except sqlite3.Error as e:
             logger.error("Error creating table %s: %s", table_name, e)
 
-    @tracer.start_as_current_span("execute_query", kind=trace.SpanKind.INTERNAL)
-    def execute_query(self, query, params=()):
+    @contextmanager
+    def transaction(self):
+        """
+        Groups statements into one write transaction.
+
+        Commits when the block exits normally and rolls back if it raises.
+        Statements inside the block should pass commit=False to
+        execute_query so they do not end the transaction early.
+        """
+        # IMMEDIATE takes the write lock up front instead of on first write
+        self.cursor.execute("BEGIN IMMEDIATE")
+        try:
+            yield self
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+
+    def execute_query(self, query, params=(), commit: bool = True):
         """Executes a SQL query with optional parameters."""
         logger.debug("Executing query: %s with params: %s", query, params)
         try:
-            if self.conn is None:
-                raise sqlite3.Error(ERROR_CONNECTION_MESSAGE)
             self.cursor.execute(query, params)
-            self.conn.commit()  # Commit changes after executing
+            if commit:
+                self.conn.commit()  # Commit changes after executing
             return self.cursor.lastrowid  # Returns the ID of the last inserted row
         except sqlite3.Error as e:
             logger.error("Error executing query: %s", e)
@@ -130,35 +315,20 @@ class DatabaseManager:
             print("[DB] Error executing query:", e2)
             raise
 
-    @tracer.start_as_current_span("fetch_all", kind=trace.SpanKind.INTERNAL)
     def fetch_all(self, query, params=()):
         """Fetches all rows from a query."""
         try:
-            if self.conn is None:
-                raise sqlite3.Error()
             self.cursor.execute(query, params)
-            rows = self.cursor.fetchall()
-            if rows:
-                columns = [description[0] for description in self.cursor.description]
-                return [dict(zip(columns, row)) for row in rows]
-            return []
+            return self.cursor.fetchall()
         except sqlite3.Error as e:
             logger.error("Error fetching data: %s", e)
             return []
 
-    @tracer.start_as_current_span("fetch_one", kind=trace.SpanKind.INTERNAL)
     def fetch_one(self, query, params=()):
         """Fetches a single row from a query."""
         try:
-            if self.conn is None:
-                raise sqlite3.Error(ERROR_CONNECTION_MESSAGE)
             self.cursor.execute(query, params)
-            row = self.cursor.fetchone()
-            if row:
-                # Convert tuple to dictionary
-                columns = [description[0] for description in self.cursor.description]
-                return dict(zip(columns, row))
-            return None
+            return self.cursor.fetchone()
         except sqlite3.Error as e:
             logger.error("Error fetching data: %s", e)
             return None
@@ -168,7 +338,7 @@ class DatabaseManager:
         try:
             self.create_table(
                 "messages",
-                """
+                f"""
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     conversation_id INTEGER,
                     step INTEGER,
@@ -185,7 +355,8 @@ class DatabaseManager:
                     processing_time_ms INTEGER,
                     metadata TEXT,
                     parent_message_id INTEGER REFERENCES messages(id),
-                    uuid TEXT
+                    uuid TEXT,
+                    tool_call_name {TOOL_CALL_NAME_COLUMN}
                 """,
             )
 
@@ -200,12 +371,46 @@ class DatabaseManager:
                     temperature REAL DEFAULT 0.7,
                     max_tokens INTEGER,
                     metadata TEXT,
-                    uuid TEXT
+                    uuid TEXT,
+                    message_count INTEGER NOT NULL DEFAULT 0
                 """,
             )
 
             # Apply backward-compatible schema updates
             self.apply_schema_migrations()
+
+            # Serves both the conversation_id filter and the step ordering of
+            # get_messages; conversations.id is the rowid and needs no index
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_messages_conv_step "
+                "ON messages(conversation_id, step)"
+            )
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_messages_tool_call_name "
+                "ON messages(tool_call_name)"
+            )
+
+            # Keep conversations.message_count in step with the messages table
+            self.cursor.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS trg_messages_count_insert
+                AFTER INSERT ON messages
+                BEGIN
+                    UPDATE conversations SET message_count = message_count + 1
+                    WHERE id = NEW.conversation_id;
+                END
+                """
+            )
+            self.cursor.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS trg_messages_count_delete
+                AFTER DELETE ON messages
+                BEGIN
+                    UPDATE conversations SET message_count = message_count - 1
+                    WHERE id = OLD.conversation_id;
+                END
+                """
+            )
         except Exception as e:
             logger.exception("Error creating initial tables: %s", e)
 
@@ -227,6 +432,7 @@ class DatabaseManager:
                 ("max_tokens", "INTEGER"),
                 ("metadata", "TEXT"),
                 ("uuid", "TEXT"),
+                ("message_count", "INTEGER NOT NULL DEFAULT 0"),
             ]
 
             for col_name, col_type in new_conv_columns:
@@ -236,6 +442,17 @@ class DatabaseManager:
                     )
                     logger.info(f"Added column {col_name} to conversations table")
 
+            if "message_count" not in conv_columns:
+                # Backfill the counter for messages stored before it existed
+                self.cursor.execute(
+                    """
+                    UPDATE conversations SET message_count = (
+                        SELECT COUNT(id) FROM messages
+                        WHERE messages.conversation_id = conversations.id
+                    )
+                    """
+                )
+
             # Get existing columns for messages table
             existing_msg_columns = self._get_table_columns("messages")
             msg_columns = {col[1] for col in existing_msg_columns}
@@ -248,6 +465,7 @@ class DatabaseManager:
                 ("metadata", "TEXT"),
                 ("parent_message_id", "INTEGER REFERENCES messages(id)"),
                 ("uuid", "TEXT"),
+                ("tool_call_name", TOOL_CALL_NAME_COLUMN),
             ]
 
             for col_name, col_type in new_msg_columns:
@@ -265,9 +483,9 @@ class DatabaseManager:
             )
 
     def _get_table_columns(self, table_name: str):
-        """Get column information for a table."""
+        """Get column information for a table, generated columns included."""
         try:
-            self.cursor.execute(f"PRAGMA table_info({table_name})")
+            self.cursor.execute(f"PRAGMA table_xinfo({table_name})")
             return self.cursor.fetchall()
         except sqlite3.Error:
             return []
@@ -296,38 +514,29 @@ class DatabaseManager:
         try:
             # Get the current span from the context
             current_span = trace.get_current_span()
-            current_span.set_attribute("db.conversation_id", conversation_id)
-            current_span.set_attribute("db.step", step)
-            current_span.set_attribute("db.role", role)
-            current_span.set_attribute("db.content", content)
-            current_span.set_attribute("db.thinking", thinking)
-            current_span.set_attribute("db.tool_name", tool_name)
-            current_span.set_attribute("db.tool_calls", tool_calls)
-            current_span.set_attribute("db.tool_results", tool_results)
-            current_span.set_attribute("db.model", model)
-            current_span.set_attribute("db.name", default_db_file)
+            if current_span.is_recording():
+                # Model output can be many KB; record sizes and a content
+                # fingerprint instead of exporting the text with every insert
+                current_span.set_attributes(
+                    {
+                        "db.conversation_id": conversation_id,
+                        "db.step": step,
+                        "db.role": role,
+                        "db.tool_name": tool_name,
+                        "db.model": model,
+                        "db.name": str(self.db_file),
+                        "db.content.length": len(content or ""),
+                        "db.content.sha1": hashlib.sha1(
+                            (content or "").encode()
+                        ).hexdigest()[:16],
+                        "db.thinking.length": len(thinking or ""),
+                        "db.tool_calls.length": len(tool_calls or ""),
+                        "db.tool_results.length": len(tool_results or ""),
+                    }
+                )
 
             message_id = self.execute_query(
-                """
-                INSERT INTO messages (
-                    conversation_id,
-                    step,
-                    role,
-                    content,
-                    thinking,
-                    tool_name,
-                    tool_calls,
-                    tool_results,
-                    model,
-                    confidence_score,
-                    token_count,
-                    processing_time_ms,
-                    metadata,
-                    parent_message_id,
-                    uuid
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
+                INSERT_MESSAGE_SQL,
                 (
                     conversation_id,
                     step,
@@ -356,36 +565,112 @@ class DatabaseManager:
             logger.error("Error inserting message: %s", e)
             return None
 
-    @tracer.start_as_current_span("get_messages", kind=trace.SpanKind.INTERNAL)
-    def get_messages(self, conversation_id: int):
-        """Fetches messages for a specific conversation."""
+    @tracer.start_as_current_span("insert_messages_bulk", kind=trace.SpanKind.INTERNAL)
+    def insert_messages_bulk(self, rows):
+        """
+        Inserts many messages in a single transaction.
+
+        Args:
+        rows: Iterable of (conversation_id, step, role, content) tuples.
+
+        Returns:
+        int: Number of inserted rows, or None on error.
+        """
         try:
-            return self.fetch_all(
-                """
-                SELECT *
-                FROM messages
-                WHERE conversation_id = ?
-                ORDER BY step ASC
-                """,
-                (conversation_id,),
+            with self.transaction():
+                self.cursor.executemany(
+                    """
+                    INSERT INTO messages (conversation_id, step, role, content)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    rows,
+                )
+            logger.info("Inserted %d messages in bulk", self.cursor.rowcount)
+            return self.cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error("Error inserting messages in bulk: %s", e)
+            return None
+
+    @tracer.start_as_current_span("get_messages", kind=trace.SpanKind.INTERNAL)
+    def get_messages(self, conversation_id: int, columns: tuple | None = None):
+        """
+        Fetches messages for a specific conversation.
+
+        Args:
+        conversation_id (int): The conversation to read.
+        columns (tuple | None): Column names to select; all columns when None.
+
+        Returns:
+        list: Message rows ordered by step.
+        """
+        if columns is None:
+            query = SELECT_MESSAGES_SQL
+        else:
+            unknown = set(columns) - MESSAGE_COLUMNS
+            if unknown:
+                raise ValueError(f"Unknown message columns: {sorted(unknown)}")
+            query = (
+                f"SELECT {', '.join(columns)} FROM messages "
+                "WHERE conversation_id = ? ORDER BY step ASC"
             )
+        try:
+            return self.fetch_all(query, (conversation_id,))
         except sqlite3.Error as e:
             logger.error(
                 "Error fetching messages for conversation_id %d: %s", conversation_id, e
             )
             return []
 
-    @tracer.start_as_current_span("get_conversations", kind=trace.SpanKind.INTERNAL)
-    def get_conversations(self, limit: int = 10, offset: int = 0):
-        """Fetches conversations with pagination."""
+    @tracer.start_as_current_span("get_message_headers", kind=trace.SpanKind.INTERNAL)
+    def get_message_headers(self, conversation_id: int):
+        """
+        Fetches lightweight message summaries for a conversation.
+
+        Reads id, step, role, model, timestamp and the content length
+        (content_len) without loading the message bodies.
+        """
         try:
-            return self.fetch_all(
-                "SELECT * FROM conversations ORDER BY id DESC LIMIT ? OFFSET ?",
-                (limit, offset),
+            return self.fetch_all(SELECT_MESSAGE_HEADERS_SQL, (conversation_id,))
+        except sqlite3.Error as e:
+            logger.error(
+                "Error fetching message headers for conversation_id %d: %s",
+                conversation_id,
+                e,
             )
+            return []
+
+    @tracer.start_as_current_span("get_conversations", kind=trace.SpanKind.INTERNAL)
+    def get_conversations(self, limit: int = 10, before_id: int | None = None):
+        """
+        Fetches conversations newest first, with keyset pagination.
+
+        Args:
+        limit (int): Maximum number of conversations to return.
+        before_id (int | None): Only return conversations with a smaller ID;
+            pass the next_before_id of the previous page to get the next.
+
+        Returns:
+        tuple: (rows, next_before_id). Rows are ordered by ID, descending;
+            next_before_id is the last row's ID, or None when the page is
+            short and there are no more conversations.
+        """
+        try:
+            if before_id is None:
+                rows = self.fetch_all(
+                    "SELECT * FROM conversations ORDER BY id DESC LIMIT ?",
+                    (limit,),
+                )
+            else:
+                rows = self.fetch_all(
+                    "SELECT * FROM conversations WHERE id < ? "
+                    "ORDER BY id DESC LIMIT ?",
+                    (before_id, limit),
+                )
         except sqlite3.Error as e:
             logger.error("Error fetching conversations with pagination: %s", e)
-            return []
+            return [], None
+        next_before_id = rows[-1]["id"] if rows and len(rows) == limit else None
+        return rows, next_before_id
 
     @tracer.start_as_current_span("get_conversation", kind=trace.SpanKind.INTERNAL)
     def get_conversation(self, conversation_id: int):
@@ -403,12 +688,9 @@ class DatabaseManager:
     def get_message_count(self, conversation_id: int) -> int:
         """Fetches the number of messages for a specific conversation."""
         try:
-            self.cursor.execute(
-                "SELECT COUNT(id) FROM messages WHERE conversation_id = ?",
-                (conversation_id,),
-            )
-            count = self.cursor.fetchone()[0]
-            return count
+            self.cursor.execute(COUNT_MESSAGES_SQL, (conversation_id,))
+            row = self.cursor.fetchone()
+            return row[0] if row is not None else 0
         except sqlite3.Error as e:
             logger.error(
                 "Error fetching message count for conversation_id %d: %s",
@@ -417,12 +699,9 @@ class DatabaseManager:
             )
             return 0
 
-    @tracer.start_as_current_span("drop_table", kind=trace.SpanKind.INTERNAL)
     def drop_table(self, table_name: str):
         """Drops the specified table."""
         try:
-            if self.conn is None:
-                raise sqlite3.Error(ERROR_CONNECTION_MESSAGE)
             self.cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
             self.conn.commit()
             logger.info("Dropped table: %s", table_name)
@@ -475,6 +754,22 @@ class DatabaseManager:
             raise
 
 
+@lru_cache(maxsize=1)
+def load_words() -> tuple:
+    """
+    Loads the nltk words corpus once per process.
+
+    The download check and the ~236k-entry list are paid on the first call
+    only; later calls return the cached tuple.
+    """
+    import nltk
+
+    nltk.download("words", quiet=True)
+    from nltk.corpus import words
+
+    return tuple(words.words())
+
+
 class DatabaseUtils:
     @tracer.start_as_current_span("generate_random_name", kind=trace.SpanKind.INTERNAL)
     def generate_random_name(self, n: int = 3) -> str:
@@ -487,10 +782,14 @@ class DatabaseUtils:
         Returns:
         str: A random name consisting of n words in lowercase joined by hyphens.
         """
-        import nltk
-
-        nltk.download("words")
-        from nltk.corpus import words
-        from random import sample
-
-        return "-".join(sample(words.words(), n)).lower()
+        words = load_words()
+        if n > len(words):
+            raise ValueError("Cannot pick more words than the corpus holds")
+        # A few index draws with a repeat check; cheaper than random.sample for
+        # a handful of words out of ~236k
+        picked = []
+        while len(picked) < n:
+            word = words[random.randrange(len(words))]
+            if word not in picked:
+                picked.append(word)
+        return "-".join(picked).lower()
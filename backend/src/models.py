@@ -1,7 +1,8 @@
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Union, get_args, get_origin
 from datetime import datetime
-from dataclasses import dataclass, asdict, field
+from dataclasses import dataclass, field, fields, is_dataclass
 from enum import Enum
+import json
 import uuid
 
 
@@ -13,7 +14,50 @@ class Role(Enum):
     TOOL = "tool"
 
 
-@dataclass
+def json_default(value: Any) -> Any:
+    """Encode the non-JSON field types the models carry."""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# Same output shape as the JSON responses FastAPI renders
+dump_json_value = json.JSONEncoder(
+    ensure_ascii=False, separators=(",", ":"), default=json_default
+).encode
+
+
+def json_dataclass(cls):
+    """
+    Adds a to_json method generated from the dataclass fields.
+
+    The method source is built once when the class is defined, one
+    concatenation per field, so serializing an instance does no field
+    introspection. Lists of json_dataclass instances are inlined through
+    their own to_json.
+    """
+    parts = []
+    for index, f in enumerate(fields(cls)):
+        key = ("{" if index == 0 else ",") + json.dumps(f.name) + ":"
+        if get_origin(f.type) is list and is_dataclass(get_args(f.type)[0]):
+            value = f"'[' + ','.join([item.to_json() for item in self.{f.name}]) + ']'"
+        else:
+            value = f"dump_json_value(self.{f.name})"
+        parts.append(f"{key!r} + {value}")
+    source = "def to_json(self):\n    return " + " + ".join(parts) + " + '}'\n"
+    namespace = {}
+    exec(source, {"dump_json_value": dump_json_value}, namespace)
+    to_json = namespace["to_json"]
+    to_json.__qualname__ = f"{cls.__qualname__}.to_json"
+    to_json.__doc__ = "Serialize every field to a JSON string."
+    cls.to_json = to_json
+    return cls
+
+
+@json_dataclass
+@dataclass(slots=True)
 class ChatMessage:
     """Represents a single message in a conversation."""
 
@@ -61,13 +105,27 @@ class ChatMessage:
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert message to dictionary format."""
-        data = asdict(self)
-        if isinstance(data.get("role"), Enum):
-            data["role"] = data["role"].value
-
-        # Serialize datetime if present
-        if isinstance(data.get("timestamp"), datetime):
-            data["timestamp"] = data["timestamp"].isoformat()
+        # Built field by field: asdict would deep-copy every value on each call
+        role = self.role
+        timestamp = self.timestamp
+        data = {
+            "role": role.value if isinstance(role, Enum) else role,
+            "content": self.content,
+            "id": self.id,
+            "timestamp": (
+                timestamp.isoformat() if isinstance(timestamp, datetime) else timestamp
+            ),
+            "thinking": self.thinking,
+            "tool_calls": self.tool_calls,
+            "tool_name": self.tool_name,
+            "model": self.model,
+            "metadata": self.metadata,
+            "confidence_score": self.confidence_score,
+            "token_count": self.token_count,
+            "processing_time_ms": self.processing_time_ms,
+            "parent_message_id": self.parent_message_id,
+            "uuid": self.uuid,
+        }
 
         # Filter out None values for cleaner API payloads
         return {k: v for k, v in data.items() if v is not None}
@@ -85,7 +143,8 @@ class ChatMessage:
         self.metadata[key] = value
 
 
-@dataclass
+@json_dataclass
+@dataclass(slots=True)
 class Conversation:
     """Represents a conversation session."""
 
@@ -135,6 +194,13 @@ class Conversation:
         self.messages.append(message)
         self.updated_at = datetime.now()
 
+    def extend_messages(self, messages: List[ChatMessage]):
+        """Add several messages at once; nothing is added if any is invalid."""
+        for message in messages:
+            message.validate()
+        self.messages.extend(messages)
+        self.updated_at = datetime.now()
+
     def get_last_message(self) -> Optional[ChatMessage]:
         """Get the last message in the conversation."""
         return self.messages[-1] if self.messages else None
@@ -163,24 +229,26 @@ class Conversation:
     def update_config(self, **config: Any) -> None:
         """Update conversation configuration."""
         for key, value in config.items():
-            if hasattr(self, key):
+            if key in CONVERSATION_FIELD_NAMES:
                 setattr(self, key, value)
         self.updated_at = datetime.now()
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert conversation to dictionary format."""
-        conv_dict = asdict(self)
-
-        # Serialize datetime fields
-        if self.created_at:
-            conv_dict["created_at"] = self.created_at.isoformat()
-        if self.updated_at:
-            conv_dict["updated_at"] = self.updated_at.isoformat()
-
-        if self.messages:
-            conv_dict["messages"] = [m.to_dict() for m in self.messages]
-
-        return conv_dict
+        return {
+            "id": self.id,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "title": self.title,
+            "model": self.model,
+            "metadata": self.metadata,
+            "messages": [m.to_dict() for m in self.messages],
+            "model_name": self.model_name,
+            "system_prompt": self.system_prompt,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "uuid": self.uuid,
+        }
 
     def get_metadata_value(self, key: str, default: Any = None) -> Any:
         """Get a specific metadata value."""
@@ -194,3 +262,7 @@ class Conversation:
             self.metadata = {}
         self.metadata[key] = value
         self.updated_at = datetime.now()
+
+
+# Computed once at import instead of introspecting the dataclass per call
+CONVERSATION_FIELD_NAMES = frozenset(f.name for f in fields(Conversation))
@@ -9,6 +9,8 @@ from opentelemetry import trace
 
 tracer = trace.get_tracer(__name__)
 
+WEATHER_CONDITIONS = ("sunny", "cloudy", "rainy", "snowy", "foggy")
+
 
 def get_weather_impl(city: str) -> str:
     """
@@ -26,8 +28,7 @@ def get_weather_impl(city: str) -> str:
     # Add attributes to the span
     current_span.set_attribute("input.city", city)
 
-    temperatures = list(range(-10, 35))
-    temp = random.choice(temperatures)
+    temp = random.randint(-10, 34)
 
     return f"The temperature in {city} is {temp}°C"
 
@@ -48,5 +49,4 @@ def get_weather_conditions_impl(city: str) -> str:
     # Add attributes to the span
     current_span.set_attribute("input.city", city)
 
-    conditions = ["sunny", "cloudy", "rainy", "snowy", "foggy"]
-    return random.choice(conditions)
+    return random.choice(WEATHER_CONDITIONS)
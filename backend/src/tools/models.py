@@ -5,6 +5,7 @@ This module provides models for tools with metadata, versioning, and execution t
 """
 
 import logging
+import threading
 import uuid
 from dataclasses import dataclass, field
 from datetime import datetime
@@ -16,6 +17,9 @@ from opentelemetry import trace
 
 logger = logging.getLogger("tools_logger")
 tracer = trace.get_tracer(__name__)
+# Guards tool usage tracking when calls run in worker threads. Kept off the
+# Tool dataclass so asdict() and deepcopy() still work on tools.
+stats_lock = threading.Lock()
 
 
 class ToolStatus(Enum):
@@ -69,6 +73,9 @@ class Tool:
     # Configuration
     max_execution_time_ms: int = 30000  # 30 seconds default
     retry_count: int = 3
+    # Seconds a result is reused for identical arguments; None disables caching.
+    # Cached calls are not counted in the usage tracking above
+    cache_ttl_seconds: Optional[float] = None
 
     # Tool ID
     tool_id: str = field(default_factory=lambda: str(uuid.uuid4()))
@@ -112,8 +119,9 @@ class Tool:
 
         try:
             # Update usage tracking
-            self.call_count += 1
-            self.last_used = start_time
+            with stats_lock:
+                self.call_count += 1
+                self.last_used = start_time
 
             with tracer.start_as_current_span(
                 name=f"tool_{self.name}",
@@ -137,14 +145,15 @@ class Tool:
                 execution_time = (end_time - start_time).total_seconds() * 1000
 
                 # Update average execution time
-                if self.call_count == 1:
-                    self.average_execution_time_ms = execution_time
-                else:
-                    # Running average
-                    self.average_execution_time_ms = (
-                        self.average_execution_time_ms * (self.call_count - 1)
-                        + execution_time
-                    ) / self.call_count
+                with stats_lock:
+                    if self.call_count == 1:
+                        self.average_execution_time_ms = execution_time
+                    else:
+                        # Running average
+                        self.average_execution_time_ms = (
+                            self.average_execution_time_ms * (self.call_count - 1)
+                            + execution_time
+                        ) / self.call_count
 
                 span.set_attribute("tool.execution_time_ms", execution_time)
                 span.set_attribute(
@@ -178,6 +187,7 @@ class Tool:
             "documentation_url": self.documentation_url,
             "max_execution_time_ms": self.max_execution_time_ms,
             "retry_count": self.retry_count,
+            "cache_ttl_seconds": self.cache_ttl_seconds,
             "versions": {
                 ver: {
                     "version": info.version,
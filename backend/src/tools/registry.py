@@ -6,6 +6,9 @@ including registration, execution, and statistics tracking.
 """
 
 import logging
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
@@ -13,6 +16,10 @@ from .models import Tool, ToolStatus
 
 logger = logging.getLogger("tools_logger")
 
+# Most cached results kept; past it the least recently used are evicted.
+# Expired entries are dropped when looked up.
+RESULT_CACHE_MAX_ENTRIES = 1024
+
 
 class ToolRegistry:
     """Registry for managing tools with versioning."""
@@ -20,10 +27,29 @@ class ToolRegistry:
     def __init__(self):
         self.tools: Dict[str, Tool] = {}
         self.tool_categories: Dict[str, List[str]] = {}
+        # Function name -> tool, so calls from the model resolve in O(1)
+        self.tools_by_function_name: Dict[str, Tool] = {}
+        # Tools pre-partitioned by status and keyed by name, so the listing
+        # queries need no scan. Status changes go through set_tool_status.
+        self.active_tools: Dict[str, Tool] = {}
+        self.enabled_tools_by_category: Dict[str, Dict[str, Tool]] = {}
+        # Tool name -> category its enabled entry was filed under
+        self.indexed_categories: Dict[str, str] = {}
+        # (tool_id, args, kwargs) -> (expires_at, result) for tools with a TTL,
+        # least recently used first
+        self.result_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        # Tools run in worker threads, so cache reads, writes and sweeps lock
+        self.result_cache_lock = threading.Lock()
 
     def register_tool(self, tool: Tool) -> None:
         """Register a tool in the registry."""
+        previous = self.tools.get(tool.name)
+        if previous is not None:
+            self.tools_by_function_name.pop(previous.function.__name__, None)
+            self._unindex_status(previous)
         self.tools[tool.name] = tool
+        self.tools_by_function_name[tool.function.__name__] = tool
+        self._index_status(tool)
 
         # Update category index
         if tool.category not in self.tool_categories:
@@ -33,32 +59,59 @@ class ToolRegistry:
 
         logger.info(f"Registered tool: {tool.name} v{tool.current_version}")
 
+    def set_tool_status(self, name: str, status: ToolStatus) -> None:
+        """Change a registered tool's status and move it between buckets."""
+        tool = self.tools.get(name)
+        if tool is None:
+            raise ValueError(f"Tool '{name}' not found in registry")
+
+        self._unindex_status(tool)
+        tool.status = status
+        self._index_status(tool)
+
+    def _index_status(self, tool: Tool) -> None:
+        """Add a tool to the status buckets it belongs in."""
+        if tool.status == ToolStatus.ACTIVE:
+            self.active_tools[tool.name] = tool
+        if tool.status != ToolStatus.DISABLED:
+            self.enabled_tools_by_category.setdefault(tool.category, {})[
+                tool.name
+            ] = tool
+            self.indexed_categories[tool.name] = tool.category
+
+    def _unindex_status(self, tool: Tool) -> None:
+        """Remove a tool from the buckets it was filed under."""
+        self.active_tools.pop(tool.name, None)
+        category = self.indexed_categories.pop(tool.name, None)
+        if category is not None:
+            self.enabled_tools_by_category[category].pop(tool.name, None)
+
     def get_tool(self, name: str) -> Optional[Tool]:
         """Get a tool by name."""
         return self.tools.get(name)
 
     def get_tool_by_function_name(self, function_name: str) -> Optional[Tool]:
         """Get a tool by its function name."""
-        for tool in self.tools.values():
-            if tool.function.__name__ == function_name:
-                return tool
-        return None
+        return self.tools_by_function_name.get(function_name)
 
     def execute_tool(self, name: str, *args, **kwargs) -> Any:
         """Execute a tool by name."""
-        tool = self.get_tool(name)
-        if not tool:
+        # One dict probe; no membership test before indexing
+        tool = self.tools.get(name)
+        if tool is None:
             raise ValueError(f"Tool '{name}' not found in registry")
 
         if tool.status == ToolStatus.DISABLED:
             raise ValueError(f"Tool '{name}' is disabled")
 
+        if tool.cache_ttl_seconds:
+            return self._execute_cached(tool, args, kwargs)
         return tool.execute(*args, **kwargs)
 
     def execute_tool_by_function_name(self, function_name: str, *args, **kwargs) -> Any:
         """Execute a tool by function name."""
         tool = self.get_tool_by_function_name(function_name)
-        if not tool:
+        if tool is None:
             raise ValueError(
                 f"Tool with function '{function_name}' not found in registry"
             )
@@ -66,26 +119,55 @@ class ToolRegistry:
         if tool.status == ToolStatus.DISABLED:
             raise ValueError(f"Tool with function '{function_name}' is disabled")
 
+        if tool.cache_ttl_seconds:
+            return self._execute_cached(tool, args, kwargs)
         return tool.execute(*args, **kwargs)
 
+    def _execute_cached(self, tool: Tool, args: tuple, kwargs: dict) -> Any:
+        """
+        Execute a tool, reusing a result for the same arguments within its TTL.
+
+        Cache hits skip tool.execute, so they are not counted in the tool's
+        call_count or average_execution_time_ms; those track real executions.
+        """
+        # Keyed by tool_id, so re-registering a tool never serves old results
+        key = (tool.tool_id, args, frozenset(kwargs.items()))
+        try:
+            hash(key)
+        except TypeError:
+            return tool.execute(*args, **kwargs)  # Unhashable arguments
+
+        now = time.monotonic()
+        with self.result_cache_lock:
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                if cached[0] > now:
+                    self.result_cache.move_to_end(key)
+                    return cached[1]
+                del self.result_cache[key]
+
+        # Executed outside the lock so other calls are not held up
+        result = tool.execute(*args, **kwargs)
+        with self.result_cache_lock:
+            self.result_cache[key] = (now + tool.cache_ttl_seconds, result)
+            self.result_cache.move_to_end(key)
+            # Evicting from the least recently used end keeps inserts O(1)
+            while len(self.result_cache) > RESULT_CACHE_MAX_ENTRIES:
+                self.result_cache.popitem(last=False)
+        return result
+
     def get_tools_by_category(self, category: str) -> List[Tool]:
         """Get all tools in a specific category."""
-        return [
-            tool
-            for tool in self.tools.values()
-            if tool.category == category and tool.status != ToolStatus.DISABLED
-        ]
+        return list(self.enabled_tools_by_category.get(category, {}).values())
 
     def get_active_tools(self) -> List[Tool]:
         """Get all active tools."""
-        return [
-            tool for tool in self.tools.values() if tool.status == ToolStatus.ACTIVE
-        ]
+        return list(self.active_tools.values())
 
     def get_tool_stats(self) -> Dict[str, Any]:
         """Get statistics about registered tools."""
         total_tools = len(self.tools)
-        active_tools = len(self.get_active_tools())
+        active_tools = len(self.active_tools)
         total_calls = sum(tool.call_count for tool in self.tools.values())
 
         categories_stats = {}
@@ -3,13 +3,17 @@ Global test configuration and fixtures.
 """
 
 import os
+import tempfile
 import pytest
 from contextlib import contextmanager
+from importlib.util import find_spec
 
 # Keep OpenTelemetry disabled for tests to avoid interference
 os.environ["OTEL_SDK_DISABLED"] = "true"
 # Ensure tests use in-memory database
 os.environ["TESTING"] = "true"
+# The agent route builds its Ollama client at import time
+os.environ.setdefault("OLLAMA_URL", "http://localhost:11434")
 
 
 def pytest_sessionstart(session):
@@ -18,8 +22,11 @@ def pytest_sessionstart(session):
     test_db_file = os.environ.get("TEST_DB_FILE")
     if test_db_file and os.path.exists(test_db_file):
         os.unlink(test_db_file)
-    # Clear the environment variable to force creation of a new temp file
-    os.environ.pop("TEST_DB_FILE", None)
+    # Give every xdist worker its own database file so parallel runs never
+    # share SQLite state (the variable is inherited from the controller).
+    fd, test_db_file = tempfile.mkstemp(suffix=".db", prefix=f"test_{get_worker_id()}_")
+    os.close(fd)
+    os.environ["TEST_DB_FILE"] = test_db_file
 
 
 def pytest_sessionfinish(session, exitstatus):
@@ -32,10 +39,13 @@ def pytest_sessionfinish(session, exitstatus):
 
 
 @contextmanager
-def managed_db_connection(db_file=None):
+def managed_db_connection(db_file=None, template=None):
     """
     Context manager for properly managing database connections in tests.
     Ensures connections are always closed to prevent ResourceWarnings.
+
+    When a template connection is given, its pages are copied into the
+    database with the SQLite online backup API instead of re-running the DDL.
     """
     from src.database.db import DatabaseManager
 
@@ -43,18 +53,103 @@ def managed_db_connection(db_file=None):
     db_manager = DatabaseManager(db_file=db_file) if db_file else DatabaseManager()
     try:
         db_manager.connect()
-        db_manager.create_init_tables()
+        if template is not None:
+            template.backup(raw_connection(db_manager.conn))
+        else:
+            db_manager.create_init_tables()
         yield db_manager
     finally:
         if db_manager.conn:
             db_manager.close()
 
 
+def raw_connection(conn):
+    """Unwrap the OpenTelemetry connection proxy; backup() needs the real object."""
+    return getattr(conn, "__wrapped__", conn)
+
+
+def get_worker_id():
+    """Return the pytest-xdist worker id, or "master" when not distributed."""
+    return os.environ.get("PYTEST_XDIST_WORKER", "master")
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    """
+    Run the @pytest.mark.anyio tests on asyncio only, like the app itself,
+    on the uvloop event loop when it is installed.
+    """
+    return ("asyncio", {"use_uvloop": find_spec("uvloop") is not None})
+
+
+@pytest.fixture(scope="session", autouse=True)
+async def shared_event_loop(anyio_backend):
+    """
+    Hold the anyio test runner open for the session so every async test
+    reuses one event loop instead of building and tearing down its own.
+    """
+    yield
+
+
+@pytest.fixture(scope="session")
+def fastapi_app():
+    """
+    Imports the FastAPI application once for the whole session; route
+    registration and Ollama client setup run when a test first asks for it.
+    """
+    os.environ.setdefault("OLLAMA_URL", "http://localhost:11434")
+    from src.app import app
+
+    return app
+
+
+@pytest.fixture(autouse=True)
+def freeze_db_module():
+    """
+    Snapshots the globals of src.database.db (e.g. default_db_file) and puts
+    them back after each test, so tests that mutate the environment or the
+    module never leak a re-initialized database location into the next one.
+    """
+    import src.database.db as db_module
+
+    snapshot = dict(db_module.__dict__)
+    yield db_module
+    db_module.__dict__.update(snapshot)
+
+
+@pytest.fixture(scope="session")
+def schema_template():
+    """
+    Builds the initial schema once per worker in an in-memory template database.
+
+    The template is keyed by the xdist worker id so that parallel workers never
+    share it; tests receive a copy through the SQLite online backup API.
+    """
+    from src.database.db import DatabaseManager
+
+    template_uri = f"file:tpl_{get_worker_id()}?mode=memory&cache=shared"
+    template = DatabaseManager(db_file=template_uri)
+    template.connect()
+    template.create_init_tables()
+    yield raw_connection(template.conn)
+    template.close()
+
+
 @pytest.fixture(scope="function")
-def clean_db_manager():
+def clean_db_manager(schema_template):
     """
     Provides a clean database manager that properly closes connections.
-    Uses the shared test database file for consistency.
+    Uses the shared test database file for consistency, reset to the
+    pre-built schema template at the start of every test.
     """
-    with managed_db_connection() as db_manager:
+    with managed_db_connection(template=schema_template) as db_manager:
         yield db_manager
+
+
+@pytest.fixture(scope="function")
+def seeded_db(clean_db_manager):
+    """
+    Provides a clean database manager for tests that seed their own rows
+    before exercising code that opens its own connections.
+    """
+    yield clean_db_manager
@@ -4,12 +4,59 @@ Unit tests for the ConversationManager class.
 
 import pytest
 import json
+import re
 
 from src.conversation import ConversationManager
 from src.models import Role
 
-# Import the function from conftest
-from .conftest import managed_db_connection
+NO_ACTIVE_CONVERSATION = "No active conversation"
+NO_ACTIVE_CONVERSATION_PATTERN = re.compile(NO_ACTIVE_CONVERSATION)
+
+
+def seed_conversation(db, title, messages):
+    """
+    Insert a conversation and its messages in a single transaction.
+
+    Args:
+        db: A connected DatabaseManager.
+        title: Title of the conversation.
+        messages: (step, role, content, tool_calls) tuples.
+
+    Returns:
+        The ID of the new conversation.
+    """
+    db.conn.execute("BEGIN")
+    conv_id = db.conn.execute(
+        "INSERT INTO conversations (title) VALUES (?)", (title,)
+    ).lastrowid
+    db.conn.executemany(
+        """
+        INSERT INTO messages (conversation_id, step, role, content, tool_calls)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        [(conv_id, *message) for message in messages],
+    )
+    db.conn.execute("COMMIT")
+    return conv_id
+
+
+def snapshot_message(db, conversation_id, step):
+    """
+    Fetch the persisted state of one message as a single tuple.
+
+    Returns:
+        (role, content, thinking, tool_calls, step) or None if missing.
+    """
+    db.cursor.execute(
+        """
+        SELECT role, content, thinking, tool_calls, step
+        FROM messages
+        WHERE conversation_id = ? AND step = ?
+        """,
+        (conversation_id, step),
+    )
+    row = db.cursor.fetchone()
+    return None if row is None else tuple(row)
 
 
 @pytest.fixture(scope="function")
@@ -27,9 +74,7 @@ def conversation_manager_fixture(db_manager_fixture):
     Pytest fixture that provides a ConversationManager instance initialized
     with a clean, in-memory database.
     """
-    # Ensure the fixture database has tables
-    db_manager_fixture.create_init_tables()
-
+    # The fixture database already holds the schema cloned from the template
     # Create a new conversation using the class method
     return ConversationManager.create_new(title="Test Conversation", model="test-model")
 
@@ -61,7 +106,8 @@ def test_add_user_message(conversation_manager_fixture, db_manager_fixture):
     and persists it to the database.
     """
     # Arrange: The fixture already provides a conversation
-    conversation_id = conversation_manager_fixture.get_current_conversation().id
+    convo = conversation_manager_fixture.get_current_conversation()
+    conversation_id = convo.id
     message_content = "Hello, this is a test."
     message_model = "test-model"
 
@@ -76,9 +122,8 @@ def test_add_user_message(conversation_manager_fixture, db_manager_fixture):
     assert added_message.content == message_content
 
     # Assert on the internal state of the conversation object
-    current_convo = conversation_manager_fixture.get_current_conversation()
-    assert current_convo.get_message_count() == 1
-    last_message = current_convo.get_last_message()
+    assert convo.get_message_count() == 1
+    last_message = convo.get_last_message()
     assert last_message.role == Role.USER
     assert last_message.content == message_content
 
@@ -97,7 +142,8 @@ def test_add_assistant_message(conversation_manager_fixture, db_manager_fixture)
     and persists it correctly.
     """
     # Arrange
-    conversation_id = conversation_manager_fixture.get_current_conversation().id
+    convo = conversation_manager_fixture.get_current_conversation()
+    conversation_id = convo.id
     # Add a user message first to make the conversation realistic
     conversation_manager_fixture.add_user_message("User message", "test-model")
 
@@ -120,18 +166,18 @@ def test_add_assistant_message(conversation_manager_fixture, db_manager_fixture)
     assert added_message.tool_calls == tool_calls
 
     # Assert on internal state
-    current_convo = conversation_manager_fixture.get_current_conversation()
-    assert current_convo.get_message_count() == 2
+    assert convo.get_message_count() == 2
 
     # Assert on database persistence
-    db_messages = db_manager_fixture.get_messages(conversation_id)
-    assert len(db_messages) == 2
-    db_message = db_messages[1]  # The assistant message is the second one
-    assert db_message["role"] == "assistant"
-    assert db_message["content"] == content
-    assert db_message["thinking"] == thinking
-    assert db_message["tool_calls"] == json.dumps(tool_calls)
-    assert db_message["step"] == 2
+    assert db_manager_fixture.get_message_count(conversation_id) == 2
+    # The assistant message is the second one
+    assert snapshot_message(db_manager_fixture, conversation_id, 2) == (
+        "assistant",
+        content,
+        thinking,
+        json.dumps(tool_calls),
+        2,
+    )
 
 
 def test_add_tool_message(conversation_manager_fixture, db_manager_fixture):
@@ -139,7 +185,8 @@ def test_add_tool_message(conversation_manager_fixture, db_manager_fixture):
     Test that add_tool_message adds a message and persists it correctly.
     """
     # Arrange
-    conversation_id = conversation_manager_fixture.get_current_conversation().id
+    convo = conversation_manager_fixture.get_current_conversation()
+    conversation_id = convo.id
     tool_name = "get_weather"
     content = "The weather is sunny."
 
@@ -163,22 +210,20 @@ def test_add_tool_message(conversation_manager_fixture, db_manager_fixture):
     assert db_message["step"] == 1
 
 
-def test_load_conversation():
+def test_load_conversation(seeded_db):
     """
     Test that load_conversation correctly reconstructs a conversation
     from the database, including all its messages.
     """
     # Arrange: Manually populate the database to simulate a past conversation
-    with managed_db_connection() as db:
-        conv_id = db.create_conversation(title="Old Conversation")
-        db.insert_message(conv_id, 1, "user", "Hello")
-        db.insert_message(
-            conv_id,
-            2,
-            "assistant",
-            "Hi there",
-            tool_calls=json.dumps([{"name": "test"}]),
-        )
+    conv_id = seed_conversation(
+        seeded_db,
+        "Old Conversation",
+        [
+            (1, "user", "Hello", ""),
+            (2, "assistant", "Hi there", json.dumps([{"name": "test"}])),
+        ],
+    )
 
     # Act
     loaded_manager = ConversationManager.load_existing(conv_id)
@@ -209,15 +254,15 @@ def test_update_conversation_title(conversation_manager_fixture, db_manager_fixt
     but does not persist to DB if the DB method is missing.
     """
     # Arrange
-    conversation_id = conversation_manager_fixture.get_current_conversation().id
+    convo = conversation_manager_fixture.get_current_conversation()
+    conversation_id = convo.id
     new_title = "Updated Title"
 
     # Act
     conversation_manager_fixture.update_conversation_title(new_title)
 
     # Assert on the in-memory object
-    current_convo = conversation_manager_fixture.get_current_conversation()
-    assert current_convo.title == new_title
+    assert convo.title == new_title
 
     # Assert that the database was NOT updated
     db_convo = db_manager_fixture.get_conversation(conversation_id)
@@ -243,23 +288,22 @@ def test_add_message_without_active_conversation(add_message_method, args):
     manager.current_conversation = None
 
     method_to_call = getattr(manager, add_message_method)
-    expected_error = "No active conversation"
 
     # Act & Assert
-    with pytest.raises(RuntimeError, match=expected_error):
+    with pytest.raises(RuntimeError) as exc_info:
         method_to_call(**args)
+    assert str(exc_info.value).startswith(NO_ACTIVE_CONVERSATION)
 
 
-def test_json_decode_error_in_load_existing():
+def test_json_decode_error_in_load_existing(seeded_db):
     """
     Test that load_existing handles JSON decode errors in tool_calls gracefully.
     """
     # Arrange: Create conversation with malformed JSON tool_calls
-    with managed_db_connection() as db:
-        conv_id = db.create_conversation(title="JSON Error Test")
-        db.insert_message(
-            conv_id, 1, "assistant", "Response", tool_calls="invalid json"
-        )
+    conv_id = seeded_db.create_conversation(title="JSON Error Test")
+    seeded_db.insert_message(
+        conv_id, 1, "assistant", "Response", tool_calls="invalid json"
+    )
 
     # Act
     loaded_manager = ConversationManager.load_existing(conv_id)
@@ -299,9 +343,8 @@ def test_load_conversation_method(conversation_manager_fixture, db_manager_fixtu
     Test the load_conversation instance method.
     """
     # Arrange - create a second conversation in DB
-    with managed_db_connection() as db:
-        conv_id = db.create_conversation(title="Second Conversation")
-        db.insert_message(conv_id, 1, "user", "Hello second")
+    conv_id = db_manager_fixture.create_conversation(title="Second Conversation")
+    db_manager_fixture.insert_message(conv_id, 1, "user", "Hello second")
 
     # Act
     loaded_convo = conversation_manager_fixture.load_conversation(conv_id)
@@ -329,7 +372,7 @@ def test_update_conversation_title_no_active_conversation():
     manager = ConversationManager.create_new(title="Test", model="test")
     manager.current_conversation = None
 
-    with pytest.raises(RuntimeError, match="No active conversation"):
+    with pytest.raises(RuntimeError, match=NO_ACTIVE_CONVERSATION_PATTERN):
         manager.update_conversation_title("New Title")
 
 
@@ -399,7 +442,7 @@ def test_export_conversation_no_active():
     manager = ConversationManager.create_new(title="Test", model="test")
     manager.current_conversation = None
 
-    with pytest.raises(RuntimeError, match="No active conversation"):
+    with pytest.raises(RuntimeError, match=NO_ACTIVE_CONVERSATION_PATTERN):
         manager.export_conversation()
 
 
@@ -7,97 +7,123 @@ table operations, error handling, and environment configuration.
 
 import os
 import pytest
+import re
 import sqlite3
-import tempfile
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
 from pathlib import Path
-from unittest.mock import patch, MagicMock
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock, Mock
 
 from src.database.db import (
+    DISCONNECTED_CURSOR,
     DatabaseManager,
     DatabaseUtils,
     get_default_db_file,
+    load_words,
     ERROR_CONNECTION_MESSAGE,
 )
+from .conftest import get_worker_id, raw_connection
+
+CONNECTION_ERROR_PATTERN = re.compile(re.escape(ERROR_CONNECTION_MESSAGE))
+
+
+@contextmanager
+def swap_execute(cursor, side_effect):
+    """Temporarily replace cursor.execute with a Mock raising side_effect."""
+    original = cursor.execute
+    cursor.execute = Mock(side_effect=side_effect)
+    try:
+        yield
+    finally:
+        cursor.execute = original
 
 
 class TestGetDefaultDbFile:
     """Test get_default_db_file function behavior under different conditions."""
 
-    def test_get_default_db_file_testing_mode(self):
+    @pytest.fixture(autouse=True)
+    def clean_db_env(self, monkeypatch):
+        """
+        Remove the variables that influence the database location.
+
+        PYTEST_CURRENT_TEST is re-set by pytest for the call phase, so tests
+        that need it gone delete it themselves.
+        """
+        for name in ("TESTING", "TEST_DB_FILE", "DATABASE_URL"):
+            monkeypatch.delenv(name, raising=False)
+
+    @pytest.fixture
+    def mocked_default_path(self):
+        """Patch the project path lookup and yield the mocked os.makedirs."""
+        with patch("src.database.db.Path") as mock_path_class:
+            with patch("src.database.db.os.makedirs") as mock_makedirs:
+                # A plain stub is enough: only resolve() is called on it
+                mock_path = SimpleNamespace(resolve=lambda: Path("/fake/project/root"))
+                mock_path_class.return_value = mock_path
+                mock_path_class.__file__ = "/fake/project/root/src/database/db.py"
+                yield mock_makedirs
+
+    def test_get_default_db_file_testing_mode(self, monkeypatch):
         """Test that testing mode returns temporary database file."""
-        with patch.dict(os.environ, {"TESTING": "true"}):
-            with patch.dict(os.environ, {}, clear=True):
-                os.environ["TESTING"] = "true"
-                # Clear any existing TEST_DB_FILE to force creation
-                if "TEST_DB_FILE" in os.environ:
-                    del os.environ["TEST_DB_FILE"]
-
-                db_file = get_default_db_file()
-                assert db_file.endswith(".db")
-                assert "test_" in db_file
-
-                # Should reuse the same file path
-                db_file2 = get_default_db_file()
-                assert db_file == db_file2
-
-    def test_get_default_db_file_pytest_mode(self):
+        monkeypatch.delenv("PYTEST_CURRENT_TEST")
+        monkeypatch.setenv("TESTING", "true")
+
+        db_file = get_default_db_file()
+        assert db_file.endswith(".db")
+        assert "test_" in db_file
+
+        # Should reuse the same file path
+        db_file2 = get_default_db_file()
+        assert db_file == db_file2
+        os.unlink(db_file)
+
+    def test_get_default_db_file_pytest_mode(self, monkeypatch):
         """Test that pytest mode returns temporary database file."""
-        with patch.dict(os.environ, {"PYTEST_CURRENT_TEST": "test_something"}):
-            with patch.dict(os.environ, {}, clear=True):
-                os.environ["PYTEST_CURRENT_TEST"] = "test_something"
-                if "TEST_DB_FILE" in os.environ:
-                    del os.environ["TEST_DB_FILE"]
+        monkeypatch.setenv("PYTEST_CURRENT_TEST", "test_something")
 
-                db_file = get_default_db_file()
-                assert db_file.endswith(".db")
+        db_file = get_default_db_file()
+        assert db_file.endswith(".db")
+        os.unlink(db_file)
 
-    def test_get_default_db_file_database_url_sqlite3(self):
+    def test_get_default_db_file_database_url_sqlite3(self, monkeypatch):
         """Test DATABASE_URL with sqlite:/// prefix."""
         test_path = "/tmp/test.db"
-        with patch.dict(
-            os.environ, {"DATABASE_URL": f"sqlite:///{test_path}"}, clear=True
-        ):
-            db_file = get_default_db_file()
-            assert db_file == test_path
+        monkeypatch.delenv("PYTEST_CURRENT_TEST")
+        monkeypatch.setenv("DATABASE_URL", f"sqlite:///{test_path}")
+
+        db_file = get_default_db_file()
+        assert db_file == test_path
 
-    def test_get_default_db_file_database_url_sqlite2(self):
+    def test_get_default_db_file_database_url_sqlite2(self, monkeypatch):
         """Test DATABASE_URL with sqlite:// prefix."""
         test_path = "/tmp/test.db"
-        with patch.dict(
-            os.environ, {"DATABASE_URL": f"sqlite://{test_path}"}, clear=True
-        ):
-            db_file = get_default_db_file()
-            assert db_file == "tmp/test.db"  # sqlite:// prefix removes the first /
+        monkeypatch.delenv("PYTEST_CURRENT_TEST")
+        monkeypatch.setenv("DATABASE_URL", f"sqlite://{test_path}")
 
-    def test_get_default_db_file_database_url_other(self):
+        db_file = get_default_db_file()
+        assert db_file == "tmp/test.db"  # sqlite:// prefix removes the first /
+
+    def test_get_default_db_file_database_url_other(
+        self, monkeypatch, mocked_default_path
+    ):
         """Test DATABASE_URL with non-SQLite URL falls back to default."""
-        with patch.dict(
-            os.environ, {"DATABASE_URL": "postgresql://localhost/db"}, clear=True
-        ):
-            with patch("src.database.db.Path") as mock_path_class:
-                with patch("src.database.db.os.makedirs") as mock_makedirs:
-                    mock_path = MagicMock()
-                    mock_path.resolve.return_value = Path("/fake/project/root")
-                    mock_path_class.return_value = mock_path
-                    mock_path_class.__file__ = "/fake/project/root/src/database/db.py"
-
-                    db_file = get_default_db_file()
-                    assert str(db_file).endswith("conversation_data.db")
-                    mock_makedirs.assert_called_once()
-
-    def test_get_default_db_file_default_path(self):
+        monkeypatch.delenv("PYTEST_CURRENT_TEST")
+        monkeypatch.setenv("DATABASE_URL", "postgresql://localhost/db")
+
+        db_file = get_default_db_file()
+        assert str(db_file).endswith("conversation_data.db")
+        mocked_default_path.assert_called_once()
+
+    def test_get_default_db_file_default_path(self, monkeypatch, mocked_default_path):
         """Test default path creation when no environment variables are set."""
-        with patch.dict(os.environ, {}, clear=True):
-            with patch("src.database.db.Path") as mock_path_class:
-                with patch("src.database.db.os.makedirs") as mock_makedirs:
-                    mock_path = MagicMock()
-                    mock_path.resolve.return_value = Path("/fake/project/root")
-                    mock_path_class.return_value = mock_path
-                    mock_path_class.__file__ = "/fake/project/root/src/database/db.py"
+        monkeypatch.delenv("PYTEST_CURRENT_TEST")
 
-                    db_file = get_default_db_file()
-                    assert str(db_file).endswith("conversation_data.db")
-                    mock_makedirs.assert_called_once()
+        db_file = get_default_db_file()
+        assert str(db_file).endswith("conversation_data.db")
+        mocked_default_path.assert_called_once()
 
 
 class TestDatabaseManager:
@@ -105,39 +131,62 @@ class TestDatabaseManager:
 
     @pytest.fixture
     def temp_db_file(self):
-        """Create a temporary database file for testing."""
-        fd, temp_file = tempfile.mkstemp(suffix=".db")
-        os.close(fd)
-        yield temp_file
-        if os.path.exists(temp_file):
-            os.unlink(temp_file)
+        """Name a private shared-cache in-memory database for the test."""
+        # Keyed by xdist worker as well, so URIs stay unique under `-n auto`
+        name = f"testdb_{get_worker_id()}_{uuid.uuid4().hex}"
+        return f"file:{name}?mode=memory&cache=shared"
 
     @pytest.fixture
     def db_manager(self, temp_db_file):
-        """Create a DatabaseManager instance with temporary database."""
-        return DatabaseManager(db_file=temp_db_file)
+        """Create a DatabaseManager instance with an in-memory database."""
+        return DatabaseManager(db_file=temp_db_file, uri=True)
+
+    @pytest.fixture
+    def initialized_db(self, db_manager, schema_template):
+        """Connect and copy the pre-built schema in with the backup API."""
+        db_manager.connect()
+        schema_template.backup(raw_connection(db_manager.conn))
+        yield db_manager
+        db_manager.close()
 
     def test_init(self, temp_db_file):
         """Test DatabaseManager initialization."""
         db_manager = DatabaseManager(db_file=temp_db_file)
         assert db_manager.db_file == temp_db_file
+        # "file:" names are opened as URIs unless told otherwise
+        assert db_manager.uri is True
+        assert DatabaseManager(db_file="plain.db").uri is False
         assert db_manager.conn is None
-        assert db_manager.cursor is None
+        assert db_manager.cursor is DISCONNECTED_CURSOR
+
+    def test_init_default_db_file_resolved_at_call_time(self):
+        """Test the module-level default is read when the manager is created."""
+        with patch("src.database.db.default_db_file", "patched.db"):
+            assert DatabaseManager().db_file == "patched.db"
 
-    def test_context_manager_testing_mode(self, temp_db_file):
+    def test_context_manager_testing_mode(self, temp_db_file, monkeypatch):
         """Test context manager in testing mode."""
-        with patch.dict(os.environ, {"TESTING": "true"}):
-            with DatabaseManager(db_file=temp_db_file) as db:
-                assert db.conn is not None
-                assert db.cursor is not None
+        monkeypatch.setenv("TESTING", "true")
+        with DatabaseManager(db_file=temp_db_file, uri=True) as db:
+            assert db.conn is not None
+            assert db.cursor is not None
+            # Testing mode creates the initial tables on entry
+            assert db.fetch_one("SELECT name FROM sqlite_master WHERE name='messages'")
         # Connection should be closed after exiting context
+        assert db.conn is None
+        assert db.cursor is DISCONNECTED_CURSOR
 
-    def test_context_manager_normal_mode(self, temp_db_file):
+    def test_context_manager_normal_mode(self, temp_db_file, monkeypatch):
         """Test context manager in normal mode."""
-        with patch.dict(os.environ, {}, clear=True):
-            with DatabaseManager(db_file=temp_db_file) as db:
-                assert db.conn is not None
-                assert db.cursor is not None
+        monkeypatch.delenv("TESTING", raising=False)
+        monkeypatch.delenv("PYTEST_CURRENT_TEST")
+        with DatabaseManager(db_file=temp_db_file, uri=True) as db:
+            assert db.conn is not None
+            assert db.cursor is not None
+            # Outside testing mode no tables are created on entry
+            assert db.fetch_one("SELECT name FROM sqlite_master") is None
+        assert db.conn is None
+        assert db.cursor is DISCONNECTED_CURSOR
 
     def test_connect_success(self, db_manager):
         """Test successful database connection."""
@@ -146,16 +195,55 @@ class TestDatabaseManager:
         assert db_manager.cursor is not None
         db_manager.close()
 
+    def test_connect_on_disk_file(self, tmp_path):
+        """Test connecting to a real database file keeps on-disk semantics."""
+        db_manager = DatabaseManager(db_file=str(tmp_path / "test.db"))
+        db_manager.connect()
+        db_manager.create_table("test_table", "id INTEGER PRIMARY KEY")
+        db_manager.close()
+
+        # Data must survive reopening the file
+        db_manager.connect()
+        result = db_manager.fetch_one(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
+            ("test_table",),
+        )
+        assert result is not None
+        db_manager.close()
+
+    def test_connect_tuning_pragmas(self, tmp_path):
+        """Test connect opens in autocommit mode with the tuning PRAGMAs applied."""
+        db_manager = DatabaseManager(db_file=str(tmp_path / "test.db"))
+        db_manager.connect()
+        try:
+            assert db_manager.conn.isolation_level is None
+            pragmas = {
+                name: db_manager.fetch_one(f"PRAGMA {name}")[0]
+                for name in ("journal_mode", "synchronous", "temp_store", "cache_size")
+            }
+            assert pragmas == {
+                "journal_mode": "wal",
+                "synchronous": 1,  # NORMAL
+                "temp_store": 2,  # MEMORY
+                "cache_size": -20000,
+            }
+        finally:
+            db_manager.close()
+
     def test_connect_pragma_error(self, db_manager):
         """Test connect method handles PRAGMA errors gracefully."""
-        with patch.object(db_manager, "cursor") as mock_cursor:
-            mock_cursor.execute.side_effect = [
-                None,  # First PRAGMA succeeds
-                Exception("PRAGMA not supported"),  # Second PRAGMA fails
-            ]
+        mock_conn = MagicMock()
+        mock_conn.cursor.return_value.execute.side_effect = [
+            None,  # First PRAGMA succeeds
+            Exception("PRAGMA not supported"),  # Second PRAGMA fails
+        ]
+        with patch("src.database.db.sqlite3.connect", return_value=mock_conn):
             # Should not raise exception
             db_manager.connect()
 
+        assert db_manager.conn is mock_conn
+        db_manager.close()
+
     def test_connect_sqlite_error(self, temp_db_file):
         """Test connect method handles SQLite errors."""
         # Use an invalid path to trigger sqlite3.Error
@@ -165,13 +253,69 @@ class TestDatabaseManager:
         db_manager.connect()
         assert db_manager.conn is None
 
+    def test_connection_per_thread(self, db_manager):
+        """Test each thread gets its own working connection from a shared manager."""
+        db_manager.connect()
+        db_manager.create_table("test_table", "id INTEGER PRIMARY KEY")
+        seen = {}
+
+        def worker():
+            seen["conn"] = db_manager.conn
+            seen["row_id"] = db_manager.execute_query(
+                "INSERT INTO test_table DEFAULT VALUES"
+            )
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+
+        try:
+            # Opened lazily on first use, separate from this thread's
+            assert seen["conn"] is not None
+            assert seen["conn"] is not db_manager.conn
+            assert seen["row_id"] == 1
+            assert db_manager.fetch_one("SELECT COUNT(*) FROM test_table")[0] == 1
+            assert len(db_manager.connections) == 2
+        finally:
+            db_manager.close()
+
+        # close() reaches the worker's connection too
+        with pytest.raises(sqlite3.ProgrammingError):
+            seen["conn"].execute("SELECT 1")
+        assert db_manager.connections == []
+
+    def test_no_connection_opened_before_connect(self, db_manager):
+        """Test other threads do not connect a manager that was never connected."""
+        seen = {}
+
+        def worker():
+            seen["conn"] = db_manager.conn
+            seen["rows"] = db_manager.fetch_all("SELECT 1")
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+
+        assert seen == {"conn": None, "rows": []}
+
     def test_close_connection(self, db_manager):
         """Test closing database connection."""
         db_manager.connect()
         assert db_manager.conn is not None
 
         db_manager.close()
-        assert db_manager.cursor is None
+        assert db_manager.conn is None
+        assert db_manager.cursor is DISCONNECTED_CURSOR
+
+    def test_close_runs_pragma_optimize(self, db_manager):
+        """Test close refreshes planner statistics before disconnecting."""
+        db_manager.connect()
+        statements = []
+        raw_connection(db_manager.conn).set_trace_callback(statements.append)
+
+        db_manager.close()
+
+        assert statements == ["PRAGMA optimize"]
 
     def test_close_no_connection(self, db_manager):
         """Test closing when no connection exists."""
@@ -202,15 +346,41 @@ class TestDatabaseManager:
         # Should handle the error gracefully (logged but not raised)
         db_manager.create_table(table_name, schema)
 
-    def test_create_table_sqlite_error(self, db_manager):
-        """Test create_table handles SQLite errors."""
-        db_manager.connect()
-
-        # Use invalid SQL to trigger error
-        with patch.object(
-            db_manager.cursor, "execute", side_effect=sqlite3.Error("Invalid SQL")
-        ):
-            db_manager.create_table("test", "invalid sql")
+    @pytest.mark.parametrize(
+        "method, args, patched_attr, expected",
+        [
+            ("create_table", ("test", "id INTEGER"), "cursor.execute", None),
+            ("execute_query", ("SELECT 1",), "cursor.execute", sqlite3.Error),
+            ("fetch_all", ("SELECT 1",), "cursor.execute", []),
+            ("fetch_one", ("SELECT 1",), "cursor.execute", None),
+            ("get_messages", (1,), "fetch_all", []),
+            ("get_message_headers", (1,), "fetch_all", []),
+            ("get_conversations", (), "fetch_all", ([], None)),
+            ("get_conversation", (1,), "fetch_one", None),
+            ("get_message_count", (1,), "cursor.execute", 0),
+            ("drop_table", ("test",), "cursor.execute", None),
+            ("create_conversation", ("Test",), "execute_query", sqlite3.Error),
+        ],
+    )
+    def test_sqlite_error_handled(
+        self, db_manager, method, args, patched_attr, expected
+    ):
+        """Test each method handles (or re-raises) SQLite errors."""
+        db_manager.connect()
+
+        # "cursor.execute" swaps the cursor method, anything else is patched
+        # on the manager itself
+        error = sqlite3.Error("Error")
+        if patched_attr == "cursor.execute":
+            failing = swap_execute(db_manager.cursor, error)
+        else:
+            failing = patch.object(db_manager, patched_attr, side_effect=error)
+        with failing:
+            if expected is sqlite3.Error:
+                with pytest.raises(sqlite3.Error):
+                    getattr(db_manager, method)(*args)
+            else:
+                assert getattr(db_manager, method)(*args) == expected
 
         db_manager.close()
 
@@ -228,27 +398,14 @@ class TestDatabaseManager:
 
     def test_execute_query_no_connection(self, db_manager):
         """Test execute_query raises error when not connected."""
-        import re
-
-        with pytest.raises(sqlite3.Error, match=re.escape(ERROR_CONNECTION_MESSAGE)):
+        with pytest.raises(sqlite3.Error, match=CONNECTION_ERROR_PATTERN):
             db_manager.execute_query("SELECT 1")
 
-    def test_execute_query_sqlite_error(self, db_manager):
-        """Test execute_query handles SQLite errors."""
-        db_manager.connect()
-
-        with pytest.raises(sqlite3.Error):
-            db_manager.execute_query("INVALID SQL")
-
-        db_manager.close()
-
     def test_execute_query_general_error(self, db_manager):
         """Test execute_query handles general exceptions."""
         db_manager.connect()
 
-        with patch.object(
-            db_manager.cursor, "execute", side_effect=ValueError("Test error")
-        ):
+        with swap_execute(db_manager.cursor, ValueError("Test error")):
             with pytest.raises(ValueError):
                 db_manager.execute_query("SELECT 1")
 
@@ -269,7 +426,7 @@ class TestDatabaseManager:
 
         assert len(results) == 2
         assert results[0]["value"] == "test1"
-        assert results[1]["value"] == "test2"
+        assert results[1][1] == "test2"  # Positional access is also supported
         db_manager.close()
 
     def test_fetch_all_empty_result(self, db_manager):
@@ -287,15 +444,16 @@ class TestDatabaseManager:
         results = db_manager.fetch_all("SELECT 1")
         assert results == []
 
-    def test_fetch_all_sqlite_error(self, db_manager):
-        """Test fetch_all handles SQLite errors."""
+    def test_statements_after_close_raise_connection_error(self, db_manager):
+        """Test a closed manager reports the connection error, not a crash."""
         db_manager.connect()
-
-        results = db_manager.fetch_all("INVALID SQL")
-        assert results == []
-
         db_manager.close()
 
+        with pytest.raises(sqlite3.Error, match=CONNECTION_ERROR_PATTERN):
+            db_manager.execute_query("SELECT 1")
+        assert db_manager.fetch_all("SELECT 1") == []
+        assert db_manager.get_message_count(1) == 0
+
     def test_fetch_one_success(self, db_manager):
         """Test successful fetch_one operation."""
         db_manager.connect()
@@ -325,15 +483,6 @@ class TestDatabaseManager:
         result = db_manager.fetch_one("SELECT 1")
         assert result is None
 
-    def test_fetch_one_sqlite_error(self, db_manager):
-        """Test fetch_one handles SQLite errors."""
-        db_manager.connect()
-
-        result = db_manager.fetch_one("INVALID SQL")
-        assert result is None
-
-        db_manager.close()
-
     def test_create_init_tables_success(self, db_manager):
         """Test successful creation of initial tables."""
         db_manager.connect()
@@ -351,6 +500,50 @@ class TestDatabaseManager:
         assert conversations_table is not None
         db_manager.close()
 
+    def test_get_messages_uses_conversation_step_index(self, initialized_db):
+        """Test message lookups are served by the (conversation_id, step) index."""
+        plan = initialized_db.fetch_all(
+            "EXPLAIN QUERY PLAN SELECT * FROM messages "
+            "WHERE conversation_id = ? ORDER BY step ASC",
+            (1,),
+        )
+
+        details = " ".join(row["detail"] for row in plan)
+        assert "idx_messages_conv_step" in details
+        assert "TEMP B-TREE" not in details  # No separate sort for ORDER BY
+
+    def test_tool_call_name_generated_from_tool_calls(self, initialized_db):
+        """Test SQLite derives and indexes the called function's name."""
+        tool_calls = '[{"function": {"name": "get_weather_impl", "arguments": {}}}]'
+        initialized_db.insert_message(1, 1, "assistant", "", tool_calls=tool_calls)
+        initialized_db.insert_message(1, 2, "user", "No tools here")
+
+        query = "SELECT step FROM messages WHERE tool_call_name = ?"
+        rows = initialized_db.fetch_all(query, ("get_weather_impl",))
+        plan = initialized_db.fetch_all(f"EXPLAIN QUERY PLAN {query}", ("x",))
+
+        assert [row["step"] for row in rows] == [1]
+        assert "idx_messages_tool_call_name" in plan[0]["detail"]
+
+    def test_schema_migration_adds_tool_call_name(self, db_manager):
+        """Test databases created before the generated column gain it."""
+        db_manager.connect()
+        db_manager.create_table(
+            "messages",
+            "id INTEGER PRIMARY KEY, conversation_id INTEGER, step INTEGER, "
+            "tool_calls TEXT",
+        )
+        db_manager.execute_query(
+            "INSERT INTO messages (conversation_id, step, tool_calls) "
+            'VALUES (1, 1, \'[{"function": {"name": "old_tool"}}]\')'
+        )
+
+        db_manager.create_init_tables()
+
+        row = db_manager.fetch_one("SELECT tool_call_name FROM messages")
+        assert row["tool_call_name"] == "old_tool"
+        db_manager.close()
+
     def test_create_init_tables_error(self, db_manager):
         """Test create_init_tables handles errors gracefully."""
         db_manager.connect()
@@ -408,15 +601,12 @@ class TestDatabaseManager:
 
         db_manager.close()
 
-    def test_insert_message_success(self, db_manager):
+    def test_insert_message_success(self, initialized_db):
         """Test successful message insertion."""
-        db_manager.connect()
-        db_manager.create_init_tables()
-
         # Create a conversation first
-        conv_id = db_manager.create_conversation(title="Test Conversation")
+        conv_id = initialized_db.create_conversation(title="Test Conversation")
 
-        message_id = db_manager.insert_message(
+        message_id = initialized_db.insert_message(
             conversation_id=conv_id,
             step=1,
             role="user",
@@ -429,7 +619,23 @@ class TestDatabaseManager:
         )
 
         assert message_id is not None
-        db_manager.close()
+
+    def test_insert_message_span_attributes_omit_text(self, initialized_db):
+        """Test insert_message records text sizes, not the text itself."""
+        span = MagicMock()
+        span.is_recording.return_value = True
+        content = "x" * 4096
+
+        with patch("src.database.db.trace.get_current_span", return_value=span):
+            initialized_db.insert_message(
+                conversation_id=1, step=1, role="assistant", content=content
+            )
+
+        (attributes,) = span.set_attributes.call_args.args
+        assert attributes["db.content.length"] == 4096
+        assert len(attributes["db.content.sha1"]) == 16
+        assert content not in attributes.values()
+        assert "db.content" not in attributes
 
     def test_insert_message_error(self, db_manager):
         """Test insert_message handles errors."""
@@ -446,103 +652,212 @@ class TestDatabaseManager:
 
         db_manager.close()
 
-    def test_get_messages_success(self, db_manager):
-        """Test successful message retrieval."""
-        db_manager.connect()
-        db_manager.create_init_tables()
+    def test_insert_messages_bulk_success(self, initialized_db):
+        """Test inserting several messages in one transaction."""
+        conv_id = initialized_db.create_conversation(title="Bulk")
+
+        inserted = initialized_db.insert_messages_bulk(
+            [(conv_id, step, "user", f"Message {step}") for step in range(1, 4)]
+        )
+
+        assert inserted == 3
+        assert initialized_db.get_message_count(conv_id) == 3
+
+    def test_insert_messages_bulk_error(self, initialized_db):
+        """Test insert_messages_bulk rolls back and returns None on error."""
+        conv_id = initialized_db.create_conversation(title="Bulk")
 
-        conv_id = db_manager.create_conversation(title="Test")
-        db_manager.insert_message(conv_id, 1, "user", "Hello")
-        db_manager.insert_message(conv_id, 2, "assistant", "Hi there")
+        # The second row has too few values, so the whole batch must fail
+        inserted = initialized_db.insert_messages_bulk(
+            [(conv_id, 1, "user", "Hello"), (conv_id, 2, "assistant")]
+        )
+
+        assert inserted is None
+        assert initialized_db.get_message_count(conv_id) == 0
+
+    def test_transaction_commits_grouped_statements(self, initialized_db):
+        """Test statements run with commit=False are committed together."""
+        query = "INSERT INTO conversations (title) VALUES (?)"
+        with initialized_db.transaction():
+            initialized_db.execute_query(query, ("First",), commit=False)
+            initialized_db.execute_query(query, ("Second",), commit=False)
+            assert initialized_db.conn.in_transaction
+
+        assert not initialized_db.conn.in_transaction
+        assert len(initialized_db.get_conversations()[0]) == 2
+
+    def test_transaction_rolls_back_on_error(self, initialized_db):
+        """Test a failing block leaves no rows behind."""
+        with pytest.raises(sqlite3.OperationalError):
+            with initialized_db.transaction():
+                initialized_db.execute_query(
+                    "INSERT INTO conversations (title) VALUES (?)",
+                    ("Lost",),
+                    commit=False,
+                )
+                initialized_db.execute_query("INSERT INTO missing_table VALUES (1)")
+
+        assert not initialized_db.conn.in_transaction
+        assert initialized_db.get_conversations() == ([], None)
+
+    def test_transaction_not_connected(self, db_manager):
+        """Test transaction refuses to start without a connection."""
+        with pytest.raises(sqlite3.Error, match=CONNECTION_ERROR_PATTERN):
+            with db_manager.transaction():
+                pass
+
+    def test_get_messages_success(self, initialized_db):
+        """Test successful message retrieval."""
+        conv_id = initialized_db.create_conversation(title="Test")
+        initialized_db.insert_messages_bulk(
+            [(conv_id, 1, "user", "Hello"), (conv_id, 2, "assistant", "Hi there")]
+        )
 
-        messages = db_manager.get_messages(conv_id)
+        messages = initialized_db.get_messages(conv_id)
 
         assert len(messages) == 2
         assert messages[0]["step"] == 1
         assert messages[1]["step"] == 2
-        db_manager.close()
 
-    def test_get_messages_error(self, db_manager):
-        """Test get_messages handles errors."""
-        db_manager.connect()
+    def test_get_messages_projected_columns(self, initialized_db):
+        """Test get_messages selects only the requested columns."""
+        conv_id = initialized_db.create_conversation(title="Test")
+        initialized_db.insert_messages_bulk([(conv_id, 1, "user", "Hello")])
 
-        with patch.object(db_manager, "fetch_all", side_effect=sqlite3.Error("Error")):
-            messages = db_manager.get_messages(1)
-            assert messages == []
+        (message,) = initialized_db.get_messages(conv_id, columns=("step", "role"))
 
-        db_manager.close()
+        assert message.keys() == ["step", "role"]
+        assert tuple(message) == (1, "user")
 
-    def test_get_conversations_success(self, db_manager):
-        """Test successful conversations retrieval."""
-        db_manager.connect()
-        db_manager.create_init_tables()
+    def test_get_messages_rejects_unknown_columns(self, initialized_db):
+        """Test column names outside the allowlist never reach the SQL."""
+        with pytest.raises(ValueError, match="Unknown message columns"):
+            initialized_db.get_messages(1, columns=("step", "1; DROP TABLE messages"))
+
+    def test_get_message_headers(self, initialized_db):
+        """Test headers carry the content length instead of the content."""
+        conv_id = initialized_db.create_conversation(title="Test")
+        initialized_db.insert_messages_bulk(
+            [(conv_id, 1, "user", "Hello"), (conv_id, 2, "assistant", "Hi there")]
+        )
 
-        db_manager.create_conversation(title="Conv1")
-        db_manager.create_conversation(title="Conv2")
+        headers = initialized_db.get_message_headers(conv_id)
 
-        conversations = db_manager.get_conversations(limit=10, offset=0)
+        assert [(h["step"], h["role"], h["content_len"]) for h in headers] == [
+            (1, "user", 5),
+            (2, "assistant", 8),
+        ]
+        assert "content" not in headers[0].keys()
+
+    def test_get_conversations_success(self, initialized_db):
+        """Test successful conversations retrieval."""
+        initialized_db.create_conversation(title="Conv1")
+        initialized_db.create_conversation(title="Conv2")
+
+        conversations, next_before_id = initialized_db.get_conversations(limit=10)
 
         assert len(conversations) == 2
-        db_manager.close()
+        assert next_before_id is None
 
-    def test_get_conversations_error(self, db_manager):
-        """Test get_conversations handles errors."""
-        db_manager.connect()
+    def test_get_conversations_keyset_pages(self, initialized_db):
+        """Test paging backwards through conversations with before_id."""
+        ids = [initialized_db.create_conversation(title=f"Conv{i}") for i in range(5)]
 
-        with patch.object(db_manager, "fetch_all", side_effect=sqlite3.Error("Error")):
-            conversations = db_manager.get_conversations()
-            assert conversations == []
+        first_page, cursor = initialized_db.get_conversations(limit=2)
+        assert cursor == first_page[-1]["id"]
+        second_page, cursor = initialized_db.get_conversations(
+            limit=2, before_id=cursor
+        )
+        last_page, cursor = initialized_db.get_conversations(limit=2, before_id=cursor)
 
-        db_manager.close()
+        assert [row["id"] for row in first_page] == ids[:2:-1]
+        assert [row["id"] for row in second_page] == ids[2:0:-1]
+        assert [row["id"] for row in last_page] == ids[:1]
+        assert cursor is None
 
-    def test_get_conversation_success(self, db_manager):
+    def test_get_conversation_success(self, initialized_db):
         """Test successful single conversation retrieval."""
-        db_manager.connect()
-        db_manager.create_init_tables()
-
-        conv_id = db_manager.create_conversation(title="Test Conv")
-        conversation = db_manager.get_conversation(conv_id)
+        conv_id = initialized_db.create_conversation(title="Test Conv")
+        conversation = initialized_db.get_conversation(conv_id)
 
         assert conversation is not None
         assert conversation["title"] == "Test Conv"
-        db_manager.close()
 
-    def test_get_conversation_error(self, db_manager):
-        """Test get_conversation handles errors."""
-        db_manager.connect()
+    def test_get_message_count_success(self, initialized_db):
+        """Test successful message count retrieval."""
+        conv_id = initialized_db.create_conversation(title="Test")
+        initialized_db.insert_messages_bulk(
+            [(conv_id, 1, "user", "Hello"), (conv_id, 2, "assistant", "Hi")]
+        )
 
-        with patch.object(db_manager, "fetch_one", side_effect=sqlite3.Error("Error")):
-            conversation = db_manager.get_conversation(1)
-            assert conversation is None
+        count = initialized_db.get_message_count(conv_id)
 
-        db_manager.close()
+        assert count == 2
 
-    def test_get_message_count_success(self, db_manager):
-        """Test successful message count retrieval."""
-        db_manager.connect()
-        db_manager.create_init_tables()
+    def test_message_count_maintained_by_triggers(self, initialized_db):
+        """Test the stored counter follows inserts and deletes."""
+        conv_id = initialized_db.create_conversation(title="Counter")
+        initialized_db.insert_messages_bulk(
+            [(conv_id, step, "user", "Hello") for step in range(1, 4)]
+        )
+        initialized_db.execute_query("DELETE FROM messages WHERE step = 2")
 
-        conv_id = db_manager.create_conversation(title="Test")
-        db_manager.insert_message(conv_id, 1, "user", "Hello")
-        db_manager.insert_message(conv_id, 2, "assistant", "Hi")
+        row = initialized_db.fetch_one(
+            "SELECT message_count FROM conversations WHERE id = ?", (conv_id,)
+        )
+        assert row["message_count"] == 2
+        assert initialized_db.get_message_count(conv_id) == 2
+        assert initialized_db.get_message_count(999) == 0  # Unknown conversation
+
+    def test_message_count_without_conversation_row(self, initialized_db):
+        """Test messages whose conversation row is missing are still counted."""
+        initialized_db.insert_messages_bulk(
+            [(42, 1, "user", "Hello"), (42, 2, "assistant", "Hi")]
+        )
 
-        count = db_manager.get_message_count(conv_id)
+        assert initialized_db.get_message_count(42) == 2
 
-        assert count == 2
-        db_manager.close()
+    def test_get_conversation_reflects_new_messages(self, initialized_db):
+        """Test the conversation row's counter is current after each insert."""
+        conv_id = initialized_db.create_conversation(title="Fresh")
+        initialized_db.insert_message(conv_id, 1, "user", "Hello")
+        assert initialized_db.get_conversation(conv_id)["message_count"] == 1
+
+        initialized_db.insert_message(conv_id, 2, "assistant", "Hi")
+        assert initialized_db.get_conversation(conv_id)["message_count"] == 2
+        assert initialized_db.get_message_count(conv_id) == 2
 
-    def test_get_message_count_error(self, db_manager):
-        """Test get_message_count handles errors."""
+    def test_schema_migration_backfills_message_count(self, db_manager):
+        """Test databases created before the counter get it filled in."""
         db_manager.connect()
+        db_manager.create_table("conversations", "id INTEGER PRIMARY KEY, title TEXT")
+        db_manager.create_table(
+            "messages", "id INTEGER PRIMARY KEY, conversation_id INTEGER, step INTEGER"
+        )
+        db_manager.execute_query("INSERT INTO conversations (id) VALUES (1)")
+        db_manager.execute_query(
+            "INSERT INTO messages (conversation_id, step) VALUES (1, 1), (1, 2)"
+        )
 
-        with patch.object(
-            db_manager.cursor, "execute", side_effect=sqlite3.Error("Error")
-        ):
-            count = db_manager.get_message_count(1)
-            assert count == 0
+        db_manager.create_init_tables()
 
+        assert db_manager.get_message_count(1) == 2
         db_manager.close()
 
+    def test_fetch_returns_sqlite_rows(self, initialized_db):
+        """Test fetches hand back sqlite3.Row views rather than copied dicts."""
+        conv_id = initialized_db.create_conversation(title="Rows")
+        initialized_db.insert_messages_bulk([(conv_id, 1, "user", "Hello")])
+
+        (message,) = initialized_db.get_messages(conv_id)
+        conversation = initialized_db.get_conversation(conv_id)
+
+        assert isinstance(message, sqlite3.Row)
+        assert isinstance(conversation, sqlite3.Row)
+        # Accessible by column name and by position
+        assert message["content"] == "Hello"
+        assert conversation["title"] == conversation[1] == "Rows"
+
     def test_drop_table_success(self, db_manager):
         """Test successful table dropping."""
         db_manager.connect()
@@ -562,24 +877,9 @@ class TestDatabaseManager:
         # Should handle error gracefully
         db_manager.drop_table("test_table")
 
-    def test_drop_table_error(self, db_manager):
-        """Test drop_table handles errors."""
-        db_manager.connect()
-
-        with patch.object(
-            db_manager.cursor, "execute", side_effect=sqlite3.Error("Error")
-        ):
-            # Should handle error gracefully
-            db_manager.drop_table("test_table")
-
-        db_manager.close()
-
-    def test_create_conversation_success(self, db_manager):
+    def test_create_conversation_success(self, initialized_db):
         """Test successful conversation creation."""
-        db_manager.connect()
-        db_manager.create_init_tables()
-
-        conv_id = db_manager.create_conversation(
+        conv_id = initialized_db.create_conversation(
             title="Test Conversation",
             model_name="gpt-4",
             system_prompt="You are helpful",
@@ -592,38 +892,20 @@ class TestDatabaseManager:
         assert conv_id is not None
 
         # Verify conversation was created
-        conv = db_manager.get_conversation(conv_id)
+        conv = initialized_db.get_conversation(conv_id)
         assert conv["title"] == "Test Conversation"
         assert conv["model_name"] == "gpt-4"
-        db_manager.close()
 
-    def test_create_conversation_empty_title(self, db_manager):
+    def test_create_conversation_empty_title(self, initialized_db):
         """Test conversation creation with empty title generates random title."""
-        db_manager.connect()
-        db_manager.create_init_tables()
-
         with patch.object(
             DatabaseUtils, "generate_random_name", return_value="random-title"
         ):
-            conv_id = db_manager.create_conversation(title="")
+            conv_id = initialized_db.create_conversation(title="")
 
-            conv = db_manager.get_conversation(conv_id)
+            conv = initialized_db.get_conversation(conv_id)
             assert conv["title"] == "random-title"
 
-        db_manager.close()
-
-    def test_create_conversation_sqlite_error(self, db_manager):
-        """Test create_conversation handles SQLite errors."""
-        db_manager.connect()
-
-        with patch.object(
-            db_manager, "execute_query", side_effect=sqlite3.Error("Error")
-        ):
-            with pytest.raises(sqlite3.Error):
-                db_manager.create_conversation(title="Test")
-
-        db_manager.close()
-
     def test_create_conversation_general_error(self, db_manager):
         """Test create_conversation handles general exceptions."""
         db_manager.connect()
@@ -635,39 +917,77 @@ class TestDatabaseManager:
         db_manager.close()
 
 
+@pytest.fixture(scope="module")
+def mock_nltk():
+    """
+    Replace the nltk package with a stub for the module's tests.
+
+    Installed once, so no test downloads or loads the real words corpus.
+    """
+    fake_nltk = MagicMock()
+    fake_nltk.corpus.words.words.return_value = [
+        "apple",
+        "banana",
+        "cherry",
+        "date",
+        "elderberry",
+    ]
+    with patch.dict(sys.modules, {"nltk": fake_nltk, "nltk.corpus": fake_nltk.corpus}):
+        yield fake_nltk
+
+
+@pytest.fixture(scope="module")
+def utils():
+    """Share one stateless DatabaseUtils instance across the module."""
+    return DatabaseUtils()
+
+
 class TestDatabaseUtils:
     """Test DatabaseUtils class functionality."""
 
-    def test_generate_random_name_default(self):
+    @pytest.fixture(autouse=True)
+    def fresh_word_cache(self):
+        """Drop the cached corpus so each test loads it through the stub."""
+        load_words.cache_clear()
+        yield
+        load_words.cache_clear()
+
+    def test_generate_random_name_default(self, utils, mock_nltk):
         """Test generate_random_name with default parameters."""
-        utils = DatabaseUtils()
-
-        with patch("nltk.download"):
-            with patch(
-                "nltk.corpus.words.words",
-                return_value=["apple", "banana", "cherry", "date", "elderberry"],
-            ):
-                with patch("random.sample", return_value=["apple", "banana", "cherry"]):
-                    name = utils.generate_random_name()
-                    assert name == "apple-banana-cherry"
-
-    def test_generate_random_name_custom_length(self):
+        with patch("random.randrange", side_effect=[0, 1, 2]):
+            name = utils.generate_random_name()
+            assert name == "apple-banana-cherry"
+
+    def test_generate_random_name_custom_length(self, utils, mock_nltk):
         """Test generate_random_name with custom length."""
-        utils = DatabaseUtils()
-
-        with patch("nltk.download"):
-            with patch(
-                "nltk.corpus.words.words",
-                return_value=["apple", "banana", "cherry", "date"],
-            ):
-                with patch("random.sample", return_value=["apple", "banana"]):
-                    name = utils.generate_random_name(n=2)
-                    assert name == "apple-banana"
-
-    def test_generate_random_name_nltk_error(self):
+        with patch("random.randrange", side_effect=[0, 1]):
+            name = utils.generate_random_name(n=2)
+            assert name == "apple-banana"
+
+    def test_generate_random_name_skips_repeated_words(self, utils, mock_nltk):
+        """Test a word drawn twice is redrawn instead of repeated."""
+        with patch("random.randrange", side_effect=[3, 3, 0, 3, 4]) as randrange:
+            assert utils.generate_random_name() == "date-apple-elderberry"
+        randrange.assert_called_with(5)
+
+    def test_generate_random_name_too_many_words(self, utils, mock_nltk):
+        """Test asking for more words than the corpus holds fails fast."""
+        with pytest.raises(ValueError):
+            utils.generate_random_name(n=6)
+
+    def test_generate_random_name_nltk_error(self, utils, mock_nltk):
         """Test generate_random_name handles NLTK errors."""
-        utils = DatabaseUtils()
-
-        with patch("nltk.download", side_effect=Exception("NLTK Error")):
+        with patch.object(mock_nltk, "download", side_effect=Exception("NLTK Error")):
             with pytest.raises(Exception):
                 utils.generate_random_name()
+
+    def test_generate_random_name_loads_corpus_once(self, utils, mock_nltk):
+        """Test the words corpus is downloaded and read only on the first call."""
+        downloads = mock_nltk.download.call_count
+        loads = mock_nltk.corpus.words.words.call_count
+
+        utils.generate_random_name()
+        utils.generate_random_name(n=2)
+
+        assert mock_nltk.download.call_count == downloads + 1
+        assert mock_nltk.corpus.words.words.call_count == loads + 1
@@ -10,23 +10,81 @@ application manages its own database connection lifecycle. For production use,
 connections are properly managed through context managers and application lifecycle.
 """
 
-import json
-import os
+import httpx
+import orjson
 import pytest
+import sqlite3
+from collections import defaultdict
 from unittest.mock import AsyncMock, patch
 from fastapi.testclient import TestClient
 
-# Mock environment before importing the app to avoid OLLAMA_URL error
-with patch.dict(os.environ, {"OLLAMA_URL": "http://localhost:11434"}):
-    from src.app import app
+from .conftest import get_worker_id
+
+INVOKE_URL = "/agent/my_local_agent/invoke"
+
+# Shared request shapes; tests override only the fields they care about
+BASE_USER_MESSAGE = {"role": "user", "model": "gpt-oss:20b"}
+BASE_PAYLOAD = {"id": 0, "title": "Test Conversation", "model": "gpt-oss:20b"}
+
+# Precomputed Ollama streams; the route only reads the chunks, so they are shared
+DONE_CHUNK = {"message": {"content": ""}, "done": True}
+HELLO_CHUNKS = (
+    {"message": {"content": "Hello! How can I help you?"}, "done": False},
+    DONE_CHUNK,
+)
+WEATHER_TOOL_CALL_CHUNKS = (
+    {
+        "message": {
+            "content": "I'll check the weather for you.",
+            "tool_calls": [
+                {
+                    "function": {
+                        "name": "get_weather_impl",
+                        "arguments": {"city": "London"},
+                    }
+                }
+            ],
+        },
+        "done": False,
+    },
+    DONE_CHUNK,
+)
+WEATHER_ANSWER_CHUNKS = (
+    {
+        "message": {"content": "The weather in London is -8°C. It's quite cold!"},
+        "done": False,
+    },
+    DONE_CHUNK,
+)
+
+
+async def replay(chunks):
+    """Stream precomputed chunks the way the Ollama client would."""
+    for chunk in chunks:
+        yield chunk
+
+
+@pytest.fixture(scope="module")
+def test_client(fastapi_app, setup_test_database):
+    """
+    FastAPI TestClient fixture that provides HTTP testing capabilities.
+
+    Shared by the module; entering it runs the app lifespan (table creation)
+    once, and clean_tables keeps the tests isolated.
+    """
+    with TestClient(fastapi_app) as client:
+        yield client
 
 
 @pytest.fixture(scope="function")
-def test_client():
+async def async_client(fastapi_app, setup_test_database):
     """
-    FastAPI TestClient fixture that provides HTTP testing capabilities.
+    httpx AsyncClient talking to the app in-process over ASGI, so the
+    streaming tests read lines natively without TestClient's thread hand-off.
     """
-    return TestClient(app)
+    transport = httpx.ASGITransport(app=fastapi_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c
 
 
 @pytest.fixture(scope="function")
@@ -34,40 +92,75 @@ def mock_ollama_response():
     """
     Mock Ollama streaming response for consistent testing.
     """
+    return lambda *args, **kwargs: replay(HELLO_CHUNKS)
 
-    async def mock_chat(*args, **kwargs):
-        # Simulate streaming response from Ollama
-        yield {"message": {"content": "Hello! How can I help you?"}, "done": False}
-        yield {"message": {"content": ""}, "done": True}
-
-    return mock_chat
 
-
-@pytest.fixture(scope="function", autouse=True)
-def setup_test_database(tmp_path):
+@pytest.fixture(scope="module", autouse=True)
+def setup_test_database():
     """
-    Use a temporary database file for each test to ensure proper cleanup.
+    Use one shared-cache in-memory database for the whole module.
+
+    The app opens and closes a connection per operation, and an in-memory
+    database disappears with its last connection, so an anchor connection is
+    held open for the module's lifetime.
     """
-    # Create a unique test database file
-    test_db_file = tmp_path / "test_conversation.db"
+    test_db_uri = f"file:e2e_{get_worker_id()}?mode=memory&cache=shared"
+    anchor = sqlite3.connect(test_db_uri, uri=True)
 
-    # Patch the default database file path
-    with patch("src.database.db.default_db_file", str(test_db_file)):
-        yield str(test_db_file)
+    # Patch the default database location
+    with patch("src.database.db.default_db_file", test_db_uri):
+        yield anchor
+    anchor.close()
 
 
-def test_get_nonexistent_conversation(test_client):
+@pytest.fixture(scope="function", autouse=True)
+def clean_tables(setup_test_database):
+    """
+    Empty the tables after each test so tests stay isolated without
+    recreating the database and schema.
     """
-    Test GET /conversation/{id} with non-existent conversation returns 404.
+    yield
+    try:
+        setup_test_database.executescript(
+            "DELETE FROM messages; DELETE FROM conversations;"
+        )
+    except sqlite3.OperationalError:
+        pass  # No request created the tables
+
+
+async def parse_stream(lines):
+    """Parse NDJSON lines as they arrive into lists of chunks keyed by stage."""
+    buckets = defaultdict(list)
+    async for line in lines:
+        if line:
+            chunk = orjson.loads(line)
+            buckets[chunk.get("stage")].append(chunk)
+    return buckets
+
+
+@pytest.mark.parametrize(
+    "method,url,json_body,expected",
+    [
+        # Non-existent conversation returns 404
+        ("GET", "/agent/my_local_agent/conversation/999", None, 404),
+        # Validation error for missing fields
+        ("POST", INVOKE_URL, {}, 400),
+    ],
+)
+def test_api_error_responses_e2e(test_client, method, url, json_body, expected):
     """
-    response = test_client.get("/agent/my_local_agent/conversation/999")
-    assert response.status_code == 404
-    assert response.json()["detail"] == "Conversation not found"
+    Test that the API endpoints exist and reject bad requests properly.
+    """
+    response = test_client.request(method, url, json=json_body)
+    assert response.status_code == expected
+    if expected == 404:
+        assert response.json()["detail"] == "Conversation not found"
 
 
+@pytest.mark.anyio
 @patch("src.agent.my_local_agent.route.ollama_client")
-def test_create_new_conversation_e2e(
-    mock_ollama_client, test_client, mock_ollama_response
+async def test_create_new_conversation_e2e(
+    mock_ollama_client, async_client, mock_ollama_response
 ):
     """
     Test creating a new conversation through the invoke endpoint.
@@ -77,117 +170,65 @@ def test_create_new_conversation_e2e(
 
     # Create new conversation (id=0 means new)
     payload = {
-        "id": 0,
-        "title": "Test Conversation",
-        "model": "gpt-oss:20b",
-        "messages": [
-            {
-                "role": "user",
-                "content": "Hello, this is a test message",
-                "model": "gpt-oss:20b",
-            }
-        ],
+        **BASE_PAYLOAD,
+        "messages": [{**BASE_USER_MESSAGE, "content": "Hello, this is a test message"}],
     }
 
-    response = test_client.post("/agent/my_local_agent/invoke", json=payload)
-    assert response.status_code == 200
-    assert response.headers["content-type"] == "text/plain; charset=utf-8"
-
-    # Verify the streaming response contains expected stages
-    response_text = response.text
-    lines = [line for line in response_text.split("\n") if line.strip()]
+    async with async_client.stream("POST", INVOKE_URL, json=payload) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "text/plain; charset=utf-8"
 
-    # Parse the JSON responses
-    responses = [json.loads(line) for line in lines]
+        # Verify the streaming response contains expected stages
+        buckets = await parse_stream(response.aiter_lines())
 
     # Should contain metadata with conversation_id
-    metadata_responses = [r for r in responses if r.get("stage") == "metadata"]
-    assert len(metadata_responses) == 1
-    assert "conversation_id" in metadata_responses[0]
+    (metadata,) = buckets["metadata"]  # Exactly one metadata chunk
+    assert "conversation_id" in metadata
 
     # Should contain content responses
-    content_responses = [r for r in responses if r.get("stage") == "content"]
-    assert len(content_responses) > 0
+    assert "content" in buckets
 
 
+@pytest.mark.anyio
 @patch("src.agent.my_local_agent.route.ollama_client")
-def test_conversation_with_tool_calls_e2e(mock_ollama_client, test_client):
+async def test_conversation_with_tool_calls_e2e(mock_ollama_client, async_client):
     """
     Test conversation flow that includes tool calls.
     """
     # Track calls to provide different responses
     call_count = 0
 
-    async def mock_chat_with_tools(*args, **kwargs):
+    def mock_chat_with_tools(*args, **kwargs):
         nonlocal call_count
         call_count += 1
 
+        # First response with tool call, then the final answer without
         if call_count == 1:
-            # First response with tool call
-            yield {
-                "message": {
-                    "content": "I'll check the weather for you.",
-                    "tool_calls": [
-                        {
-                            "function": {
-                                "name": "get_weather_impl",
-                                "arguments": {"city": "London"},
-                            }
-                        }
-                    ],
-                },
-                "done": False,
-            }
-            yield {"message": {"content": ""}, "done": True}
-        else:
-            # Second response - final answer without tool calls
-            yield {
-                "message": {
-                    "content": "The weather in London is -8°C. It's quite cold!"
-                },
-                "done": False,
-            }
-            yield {"message": {"content": ""}, "done": True}
+            return replay(WEATHER_TOOL_CALL_CHUNKS)
+        return replay(WEATHER_ANSWER_CHUNKS)
 
     mock_ollama_client.chat = AsyncMock(side_effect=mock_chat_with_tools)
 
     payload = {
-        "id": 0,
+        **BASE_PAYLOAD,
         "title": "Weather Test",
-        "model": "gpt-oss:20b",
-        "messages": [
-            {
-                "role": "user",
-                "content": "What's the weather in London?",
-                "model": "gpt-oss:20b",
-            }
-        ],
+        "messages": [{**BASE_USER_MESSAGE, "content": "What's the weather in London?"}],
     }
 
-    response = test_client.post("/agent/my_local_agent/invoke", json=payload)
-    assert response.status_code == 200
-
-    response_text = response.text
-    lines = [line for line in response_text.split("\n") if line.strip()]
-    responses = [json.loads(line) for line in lines]
-
-    # Should contain tool results
-    tool_result_responses = [r for r in responses if r.get("stage") == "tool_result"]
-    assert len(tool_result_responses) > 0
-    assert tool_result_responses[0]["tool"] == "get_weather_impl"
-
-    # Should contain content responses
-    content_responses = [r for r in responses if r.get("stage") == "content"]
-    assert len(content_responses) > 0
+    async with async_client.stream("POST", INVOKE_URL, json=payload) as response:
+        assert response.status_code == 200
+        buckets = await parse_stream(response.aiter_lines())
 
-    # Should contain finalize_answer
-    finalize_responses = [r for r in responses if r.get("stage") == "finalize_answer"]
-    assert len(finalize_responses) > 0
+    # Should contain tool results, content responses and finalize_answer
+    # (checked before indexing, which would add keys to the defaultdict)
+    assert {"tool_result", "content", "finalize_answer"} <= buckets.keys()
+    assert buckets["tool_result"][0]["tool"] == "get_weather_impl"
 
 
+@pytest.mark.anyio
 @patch("src.agent.my_local_agent.route.ollama_client")
-def test_continue_existing_conversation_e2e(
-    mock_ollama_client, test_client, mock_ollama_response
+async def test_continue_existing_conversation_e2e(
+    mock_ollama_client, async_client, mock_ollama_response
 ):
     """
     Test continuing an existing conversation.
@@ -196,36 +237,29 @@ def test_continue_existing_conversation_e2e(
 
     # First, create a conversation
     payload1 = {
-        "id": 0,
-        "title": "Test Conversation",
-        "model": "gpt-oss:20b",
-        "messages": [{"role": "user", "content": "Hello", "model": "gpt-oss:20b"}],
+        **BASE_PAYLOAD,
+        "messages": [{**BASE_USER_MESSAGE, "content": "Hello"}],
     }
 
-    response1 = test_client.post("/agent/my_local_agent/invoke", json=payload1)
-    assert response1.status_code == 200
+    async with async_client.stream("POST", INVOKE_URL, json=payload1) as response1:
+        assert response1.status_code == 200
 
-    # Extract conversation_id from first response
-    lines1 = [line for line in response1.text.split("\n") if line.strip()]
-    responses1 = [json.loads(line) for line in lines1]
-    metadata = [r for r in responses1 if r.get("stage") == "metadata"][0]
+        # Extract conversation_id from first response
+        metadata = (await parse_stream(response1.aiter_lines()))["metadata"][0]
     conversation_id = metadata["conversation_id"]
 
     # Continue the conversation
     payload2 = {
+        **BASE_PAYLOAD,
         "id": conversation_id,
-        "title": "Test Conversation",
-        "model": "gpt-oss:20b",
-        "messages": [
-            {"role": "user", "content": "How are you?", "model": "gpt-oss:20b"}
-        ],
+        "messages": [{**BASE_USER_MESSAGE, "content": "How are you?"}],
     }
 
-    response2 = test_client.post("/agent/my_local_agent/invoke", json=payload2)
+    response2 = await async_client.post(INVOKE_URL, json=payload2)
     assert response2.status_code == 200
 
     # Verify we can fetch the conversation
-    conv_response = test_client.get(
+    conv_response = await async_client.get(
         f"/agent/my_local_agent/conversation/{conversation_id}"
     )
     assert conv_response.status_code == 200
@@ -240,21 +274,8 @@ def test_invalid_payload_e2e(test_client):
     Test API with invalid payload returns proper error.
     """
     # Empty messages
-    payload = {"id": 0, "title": "Test", "model": "gpt-oss:20b", "messages": []}
+    payload = {**BASE_PAYLOAD, "title": "Test", "messages": []}
 
-    response = test_client.post("/agent/my_local_agent/invoke", json=payload)
+    response = test_client.post(INVOKE_URL, json=payload)
     assert response.status_code == 400
     assert "Query contains no messages" in response.json()["detail"]
-
-
-def test_api_structure_e2e(test_client):
-    """
-    Test that the API structure is working properly for basic cases.
-    """
-    # Test that the endpoint exists and handles missing conversation correctly
-    response = test_client.get("/agent/my_local_agent/conversation/999")
-    assert response.status_code == 404
-
-    # Test that invoke endpoint rejects invalid data
-    response = test_client.post("/agent/my_local_agent/invoke", json={})
-    assert response.status_code == 400  # Validation error for missing fields
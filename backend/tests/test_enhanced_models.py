@@ -2,23 +2,33 @@
 Unit tests for Phase 1 enhanced models (ChatMessage and Conversation).
 """
 
+import json
 import pytest
+from dataclasses import fields
 from datetime import datetime
+from pydantic import TypeAdapter
 
 from src.models import ChatMessage, Conversation, Role
 from src.conversation import ConversationManager
 from src.database.db import DatabaseManager
+from .conftest import get_worker_id, raw_connection
 
 
-@pytest.fixture(scope="function")
-def test_db_manager():
+@pytest.fixture(scope="class")
+def test_db_manager(schema_template):
     """
-    Pytest fixture to set up an in-memory SQLite database for a single test function.
+    Pytest fixture to set up a shared in-memory SQLite database for a test class.
+    The schema is copied from the session template instead of re-running the DDL,
+    and the default database file points at it, so the DatabaseManager() that
+    ConversationManager opens writes to the same database.
     """
-    db_manager = DatabaseManager(db_file=":memory:")
+    db_uri = f"file:enhanced_{get_worker_id()}?mode=memory&cache=shared"
+    db_manager = DatabaseManager(db_file=db_uri)
     db_manager.connect()
-    db_manager.create_init_tables()
-    yield db_manager
+    schema_template.backup(raw_connection(db_manager.conn))
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr("src.database.db.default_db_file", db_uri)
+        yield db_manager
     db_manager.close()
 
 
@@ -45,6 +55,14 @@ class TestEnhancedChatMessage:
         assert message.uuid is not None
         assert len(message.uuid) == 36  # UUID4 format
 
+    def test_message_uses_slots(self):
+        """Test messages carry no per-instance __dict__."""
+        message = ChatMessage(role=Role.USER, content="Hello")
+
+        assert not hasattr(message, "__dict__")
+        with pytest.raises(AttributeError):
+            message.unknown_field = "value"
+
     def test_message_uuid_auto_generation(self):
         """Test that UUID is automatically generated if not provided."""
         msg1 = ChatMessage(role=Role.USER, content="Test 1")
@@ -133,6 +151,29 @@ class TestEnhancedChatMessage:
         assert result["uuid"] is not None
         assert result["timestamp"] == timestamp.isoformat()
 
+    def test_message_to_dict_covers_every_field(self):
+        """Test the hand-written to_dict keeps up with the dataclass fields."""
+        message = ChatMessage(
+            role=Role.ASSISTANT,
+            content="Test response",
+            id=1,
+            timestamp=datetime.now(),
+            thinking="Thinking",
+            tool_calls=[{"function": {"name": "tool", "arguments": {}}}],
+            tool_name="tool",
+            model="gpt-4",
+            metadata={"source": "test"},
+            confidence_score=0.5,
+            token_count=3,
+            processing_time_ms=10,
+            parent_message_id=0,
+        )
+
+        result = message.to_dict()
+
+        assert list(result) == [f.name for f in fields(ChatMessage)]
+        assert result["tool_calls"] == message.tool_calls
+
 
 class TestEnhancedConversation:
     """Test enhanced Conversation functionality."""
@@ -157,6 +198,10 @@ class TestEnhancedConversation:
         assert conversation.metadata == {"source": "test"}
         assert conversation.uuid is not None
 
+    def test_conversation_uses_slots(self):
+        """Test conversations carry no per-instance __dict__."""
+        assert not hasattr(Conversation(), "__dict__")
+
     def test_conversation_uuid_auto_generation(self):
         """Test that UUID is automatically generated."""
         conv1 = Conversation()
@@ -208,22 +253,31 @@ class TestEnhancedConversation:
         with pytest.raises(ValueError):
             conversation.add_message(invalid_message)
 
+    def test_conversation_extend_messages_with_validation(self):
+        """Test that extend_messages adds nothing if any message is invalid."""
+        conversation = Conversation()
+
+        with pytest.raises(ValueError):
+            conversation.extend_messages(
+                [
+                    ChatMessage(role=Role.USER, content="Valid message"),
+                    ChatMessage(role=Role.USER, content="", tool_calls=None),
+                ]
+            )
+        assert conversation.get_message_count() == 0
+
     def test_conversation_utility_methods(self):
         """Test new utility methods."""
         conversation = Conversation()
 
         # Add messages with different roles and token counts
-        conversation.add_message(
-            ChatMessage(role=Role.USER, content="User 1", token_count=5)
-        )
-        conversation.add_message(
-            ChatMessage(role=Role.ASSISTANT, content="Assistant 1", token_count=10)
-        )
-        conversation.add_message(
-            ChatMessage(role=Role.USER, content="User 2", token_count=7)
-        )
-        conversation.add_message(
-            ChatMessage(role=Role.TOOL, content="Tool result", token_count=3)
+        conversation.extend_messages(
+            [
+                ChatMessage(role=Role.USER, content="User 1", token_count=5),
+                ChatMessage(role=Role.ASSISTANT, content="Assistant 1", token_count=10),
+                ChatMessage(role=Role.USER, content="User 2", token_count=7),
+                ChatMessage(role=Role.TOOL, content="Tool result", token_count=3),
+            ]
         )
 
         # Test get_messages_by_role
@@ -266,6 +320,16 @@ class TestEnhancedConversation:
         assert conversation.temperature == pytest.approx(0.9)
         assert conversation.max_tokens == 1000
 
+    def test_conversation_update_config_only_sets_fields(self):
+        """Test update_config ignores keys that are not dataclass fields."""
+        conversation = Conversation()
+
+        conversation.update_config(title="Renamed", validate=None, unknown=1)
+
+        assert conversation.title == "Renamed"
+        assert callable(conversation.validate)
+        assert not hasattr(conversation, "unknown")
+
     def test_conversation_metadata_methods(self):
         """Test conversation metadata methods."""
         conversation = Conversation()
@@ -306,10 +370,53 @@ class TestEnhancedConversation:
         assert result["created_at"] == created_at.isoformat()
         assert result["updated_at"] == updated_at.isoformat()
 
+    def test_conversation_to_dict_covers_every_field(self):
+        """Test the hand-written to_dict keeps up with the dataclass fields."""
+        message = ChatMessage(role=Role.USER, content="Hello")
+        conversation = Conversation(id=1, title="Test", messages=[message])
+
+        result = conversation.to_dict()
+
+        assert list(result) == [f.name for f in fields(Conversation)]
+        assert result["messages"] == [message.to_dict()]
+        assert result["created_at"] is None
+        assert Conversation().to_dict()["messages"] == []
+
+    def test_conversation_to_json_matches_pydantic(self):
+        """Test the generated to_json renders what the response model would."""
+        conversation = Conversation(
+            id=1,
+            title='Tést "quoted"',
+            created_at=datetime.now(),
+            metadata={"source": "test"},
+            messages=[
+                ChatMessage(
+                    role=Role.ASSISTANT,
+                    content="Hi",
+                    timestamp=datetime.now(),
+                    tool_calls=[{"function": {"name": "tool", "arguments": {}}}],
+                    confidence_score=0.5,
+                )
+            ],
+        )
+
+        result = conversation.to_json()
+
+        assert result == TypeAdapter(Conversation).dump_json(conversation).decode()
+        assert json.loads(Conversation().to_json())["messages"] == []
+
 
 class TestEnhancedConversationManager:
     """Test ConversationManager with enhanced models."""
 
+    @pytest.fixture(autouse=True)
+    def clean_tables(self, test_db_manager):
+        """Empty the shared database after each test instead of recreating it."""
+        yield
+        test_db_manager.conn.executescript(
+            "DELETE FROM messages; DELETE FROM conversations;"
+        )
+
     def test_create_new_with_enhanced_fields(self, test_db_manager):
         """Test creating a conversation with enhanced configuration."""
         conv_manager = ConversationManager.create_new(
@@ -327,6 +434,8 @@ class TestEnhancedConversationManager:
         assert conversation.temperature == pytest.approx(0.9)
         assert conversation.max_tokens == 500
         assert conversation.get_metadata_value("test") is True
+        # Written to the class database that clean_tables empties
+        assert test_db_manager.get_conversation(conversation.id) is not None
 
     def test_add_messages_with_enhanced_fields(self, test_db_manager):
         """Test adding messages with enhanced fields."""
@@ -5,37 +5,92 @@ These tests target specific error paths and edge cases to improve
 the overall test coverage from 67% to a higher percentage.
 """
 
-import json
-import os
+import httpx
+import orjson
 import pytest
-import anyio
+import runpy
+import sqlite3
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock, patch
 from fastapi.testclient import TestClient
 
+from src.models import ChatMessage, Conversation, Role
 
-# Mock environment before importing
-with patch.dict(os.environ, {"OLLAMA_URL": "http://localhost:11434"}):
-    from src.agent.my_local_agent.route import (
-        app,
-        print_trace,
-        _stream_model_response,
-        _execute_tools,
-        _stream_chat_with_tools_refactored,
-    )
+# OLLAMA_URL is set by conftest before this import
+from src.agent.my_local_agent.route import (
+    MODEL_CONFIG,
+    app,
+    encode_event,
+    print_trace,
+    _stream_model_response,
+    _execute_tools,
+    _stream_chat_with_tools_refactored,
+)
 
 
-@pytest.fixture(scope="function")
+@pytest.fixture(scope="session")
 def test_client():
-    """FastAPI TestClient fixture."""
+    """FastAPI TestClient fixture shared by every test in the session."""
+    return TestClient(app)
+
+
+@pytest.fixture(scope="function")
+async def async_client():
+    """httpx AsyncClient driving the app in-process over ASGI."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c
+
+
+@pytest.fixture(scope="function")
+def fresh_client():
+    """Unshared TestClient for tests that run the app lifespan themselves."""
     return TestClient(app)
 
 
+@pytest.fixture(scope="session")
+def db_root(tmp_path_factory):
+    """One temporary directory holding every test's database file."""
+    return tmp_path_factory.mktemp("dbs")
+
+
 @pytest.fixture(scope="function", autouse=True)
-def setup_test_database(tmp_path):
+def setup_test_database(db_root, request, monkeypatch):
     """Use a temporary database file for each test."""
-    test_db_file = tmp_path / "test_conversation.db"
-    with patch("src.database.db.default_db_file", str(test_db_file)):
-        yield str(test_db_file)
+    test_db_file = db_root / f"{request.node.name}.db"
+    monkeypatch.setattr("src.database.db.default_db_file", str(test_db_file))
+    return str(test_db_file)
+
+
+@pytest.fixture
+def mock_tracer_span():
+    """Patch the route tracer so spans are plain context-manager mocks."""
+    with patch(
+        "src.agent.my_local_agent.route.tracer.start_as_current_span"
+    ) as mock_span:
+        mock_span_instance = MagicMock()
+        mock_span_instance.__enter__ = MagicMock(return_value=mock_span_instance)
+        mock_span_instance.__exit__ = MagicMock(return_value=None)
+        mock_span.return_value = mock_span_instance
+        yield mock_span_instance
+
+
+@pytest.fixture
+def mock_ollama_client():
+    """Patch the route's Ollama client; tests configure chat() themselves."""
+    with patch("src.agent.my_local_agent.route.ollama_client") as mock_client:
+        yield mock_client
+
+
+@pytest.fixture
+def fake_tool_registry(monkeypatch):
+    """Swap the route's tool registry for a bare namespace tests fill in."""
+    registry = SimpleNamespace()
+    monkeypatch.setattr("src.agent.my_local_agent.route.tool_registry", registry)
+    return registry
 
 
 @pytest.fixture
@@ -45,12 +100,19 @@ def mock_conversation_manager():
         mock_instance = MagicMock()
         mock.create_new.return_value = mock_instance
         mock.load_existing.return_value = mock_instance
-        mock_instance.get_current_conversation.return_value = MagicMock(
+        mock_instance.get_current_conversation.return_value = SimpleNamespace(
             id=1, model="test-model", messages=[]
         )
         yield mock
 
 
+def test_encode_event():
+    """Test stream events are encoded as newline-terminated JSON bytes."""
+    line = encode_event({"stage": "tool_result", "result": {1: "café"}})
+
+    assert line == '{"stage":"tool_result","result":{"1":"café"}}\n'.encode()
+
+
 def test_print_trace():
     """Test the print_trace function with an exception."""
     try:
@@ -60,51 +122,61 @@ def test_print_trace():
         print_trace(e)
 
 
-def test_ollama_client_initialization_error():
+@pytest.mark.filterwarnings("ignore:.*found in sys.modules:RuntimeWarning")
+def test_ollama_client_initialization_error(monkeypatch):
     """Test Ollama client initialization error path."""
-    with patch.dict(os.environ, {}, clear=True):  # Remove OLLAMA_URL
-        with pytest.raises(KeyError):
-            # This should trigger the exception handling in the global initialization
-            import importlib
-            import src.agent.my_local_agent.route
-
-            importlib.reload(src.agent.my_local_agent.route)
+    monkeypatch.delenv("OLLAMA_URL")
+    with pytest.raises(KeyError):
+        # Execute the module in a throwaway namespace: this triggers the
+        # exception handling in the global initialization without replacing
+        # the cached module the other tests use.
+        runpy.run_module("src.agent.my_local_agent.route")
+
+
+@pytest.mark.filterwarnings("ignore:.*found in sys.modules:RuntimeWarning")
+def test_ollama_client_uses_pooled_transport():
+    """Test the Ollama client is built on a pooled, retrying transport."""
+    with patch("httpx.AsyncHTTPTransport") as mock_transport, patch(
+        "ollama.AsyncClient"
+    ) as mock_client:
+        namespace = runpy.run_module("src.agent.my_local_agent.route")
+
+    mock_transport.assert_called_once_with(
+        limits=namespace["OLLAMA_POOL_LIMITS"], retries=3
+    )
+    assert namespace["OLLAMA_POOL_LIMITS"].max_keepalive_connections == 40
+    assert mock_client.call_args.kwargs["transport"] is mock_transport.return_value
+    assert mock_client.call_args.kwargs["timeout"] == 300.0
 
 
 @patch("src.agent.my_local_agent.route.DatabaseManager")
-def test_lifespan_startup_error(mock_db_manager, test_client):
+def test_lifespan_startup_error(mock_db_manager, fresh_client):
     """Test lifespan startup database error."""
-    mock_db_manager.side_effect = Exception("Database connection failed")
+    mock_db_manager.side_effect = sqlite3.OperationalError("Database connection failed")
 
-    # The error should be handled in the lifespan context
-    with pytest.raises(Exception):
-        with test_client:
+    # The error should surface from the lifespan context
+    with pytest.raises(sqlite3.OperationalError, match="Database connection failed"):
+        with fresh_client:
             pass
 
 
-def test_get_tools_endpoint(test_client):
+def test_get_tools_endpoint(test_client, fake_tool_registry):
     """Test /tools endpoint."""
-    with patch("src.agent.my_local_agent.route.tool_registry") as mock_registry:
-        mock_tool = MagicMock()
-        mock_tool.to_dict.return_value = {"name": "test_tool", "version": "1.0"}
-        mock_registry.get_active_tools.return_value = [mock_tool]
+    mock_tool = SimpleNamespace(to_dict=lambda: {"name": "test_tool", "version": "1.0"})
+    fake_tool_registry.get_active_tools = lambda: [mock_tool]
 
-        response = test_client.get("/tools")
-        assert response.status_code == 200
-        assert response.json() == [{"name": "test_tool", "version": "1.0"}]
+    response = test_client.get("/tools")
+    assert response.status_code == 200
+    assert response.json() == [{"name": "test_tool", "version": "1.0"}]
 
 
-def test_get_tool_stats_endpoint(test_client):
+def test_get_tool_stats_endpoint(test_client, fake_tool_registry):
     """Test /tools/stats endpoint."""
-    with patch("src.agent.my_local_agent.route.tool_registry") as mock_registry:
-        mock_registry.get_tool_stats.return_value = {
-            "total_tools": 5,
-            "active_tools": 3,
-        }
+    fake_tool_registry.get_tool_stats = lambda: {"total_tools": 5, "active_tools": 3}
 
-        response = test_client.get("/tools/stats")
-        assert response.status_code == 200
-        assert response.json() == {"total_tools": 5, "active_tools": 3}
+    response = test_client.get("/tools/stats")
+    assert response.status_code == 200
+    assert response.json() == {"total_tools": 5, "active_tools": 3}
 
 
 def test_get_enhanced_conversation_summary_not_found(test_client):
@@ -133,363 +205,367 @@ def test_get_enhanced_conversation_summary_success(test_client):
         assert response.json() == {"summary": "test summary"}
 
 
-def test_stream_model_response_thinking_content():
-    """Test streaming with thinking and content chunks."""
-
-    async def run_test():
-        with patch(
-            "src.agent.my_local_agent.route.tracer.start_as_current_span"
-        ) as mock_span:
-            mock_span_instance = MagicMock()
-            mock_span_instance.__enter__ = MagicMock(return_value=mock_span_instance)
-            mock_span_instance.__exit__ = MagicMock(return_value=None)
-            mock_span.return_value = mock_span_instance
+# Ollama stream mixing thinking and content; only read, so shared by tests
+THINKING_CHUNKS = (
+    {"message": {"thinking": "thinking...", "content": "part1"}, "done": False},
+    {"message": {"content": "part2"}, "done": False},
+    {"message": {}, "done": True},
+)
 
-            with patch("src.agent.my_local_agent.route.ollama_client") as mock_client:
 
-                async def mock_chat_generator():
-                    yield {
-                        "message": {"thinking": "thinking...", "content": "part1"},
-                        "done": False,
-                    }
-                    yield {"message": {"content": "part2"}, "done": False}
-                    yield {"message": {}, "done": True}
+async def replay(chunks):
+    """Stream precomputed chunks the way the Ollama client would."""
+    for chunk in chunks:
+        yield chunk
 
-                mock_client.chat = AsyncMock(return_value=mock_chat_generator())
 
-                messages = [{"role": "user", "content": "test"}]
-                generator = _stream_model_response(messages, "test-model", "low", None)
+@pytest.mark.anyio
+async def test_stream_model_response_thinking_content(
+    mock_tracer_span, mock_ollama_client
+):
+    """Test streaming with thinking and content chunks."""
+    mock_ollama_client.chat = AsyncMock(return_value=replay(THINKING_CHUNKS))
 
-                results = []
-                async for result in generator:
-                    results.append(result)
+    messages = [{"role": "user", "content": "test"}]
+    generator = _stream_model_response(messages, "test-model", "low", None)
 
-                # Should have thinking and content chunks
-                thinking_chunks = [r for r in results if r.get("stage") == "thinking"]
-                content_chunks = [r for r in results if r.get("stage") == "content"]
-                assert len(thinking_chunks) > 0
-                assert len(content_chunks) > 0
+    stages = Counter([result.get("stage") async for result in generator])
 
-    anyio.run(run_test)
+    # Should have thinking and content chunks
+    assert stages["thinking"] > 0
+    assert stages["content"] > 0
 
 
-def test_stream_model_response_ollama_error():
+@pytest.mark.anyio
+async def test_stream_model_response_ollama_error(mock_tracer_span, mock_ollama_client):
     """Test Ollama client error handling in streaming."""
+    mock_ollama_client.chat.side_effect = ConnectionError("Ollama connection failed")
 
-    async def run_test():
-        with patch(
-            "src.agent.my_local_agent.route.tracer.start_as_current_span"
-        ) as mock_span:
-            mock_span_instance = MagicMock()
-            mock_span_instance.__enter__ = MagicMock(return_value=mock_span_instance)
-            mock_span_instance.__exit__ = MagicMock(return_value=None)
-            mock_span.return_value = mock_span_instance
-
-            with patch("src.agent.my_local_agent.route.ollama_client") as mock_client:
-                mock_client.chat.side_effect = Exception("Ollama connection failed")
-
-                messages = [{"role": "user", "content": "test"}]
-                generator = _stream_model_response(messages, "test-model", None, None)
-
-                with pytest.raises(Exception):
-                    async for _ in generator:
-                        pass
-
-    anyio.run(run_test)
-
-
-def test_execute_tools_missing_tool_name():
-    """Test tool execution with missing tool name."""
-
-    async def run_test():
-        mock_conv_manager = MagicMock()
-        tool_calls = [{"function": {}}]  # Missing 'name' field
-
-        with patch(
-            "src.agent.my_local_agent.route.tracer.start_as_current_span"
-        ) as mock_span:
-            mock_span_instance = MagicMock()
-            mock_span_instance.__enter__ = MagicMock(return_value=mock_span_instance)
-            mock_span_instance.__exit__ = MagicMock(return_value=None)
-            mock_span.return_value = mock_span_instance
-
-            generator = _execute_tools(tool_calls, mock_conv_manager)
-
-            results = []
-            async for result in generator:
-                results.append(result)
-
-            # Should handle missing tool name gracefully
-            assert len(results) == 0
+    messages = [{"role": "user", "content": "test"}]
+    generator = _stream_model_response(messages, "test-model", None, None)
 
-    anyio.run(run_test)
-
-
-def test_execute_tools_tool_not_found():
-    """Test tool execution when tool is not in registry."""
-
-    async def run_test():
-        mock_conv_manager = MagicMock()
-        tool_calls = [{"function": {"name": "nonexistent_tool", "arguments": {}}}]
-
-        with patch(
-            "src.agent.my_local_agent.route.tracer.start_as_current_span"
-        ) as mock_span:
-            mock_span_instance = MagicMock()
-            mock_span_instance.__enter__ = MagicMock(return_value=mock_span_instance)
-            mock_span_instance.__exit__ = MagicMock(return_value=None)
-            mock_span.return_value = mock_span_instance
-
-            with patch("src.agent.my_local_agent.route.tool_registry") as mock_registry:
-                mock_registry.get_tool_by_function_name.return_value = None
-
-                generator = _execute_tools(tool_calls, mock_conv_manager)
-
-                results = []
-                async for result in generator:
-                    results.append(result)
-
-                # Should yield tool_error for nonexistent tool
-                assert len(results) == 1
-                assert results[0]["stage"] == "tool_error"
-                assert "not found in registry" in results[0]["error"]
-
-    anyio.run(run_test)
-
-
-def test_execute_tools_execution_error():
-    """Test tool execution error handling."""
+    with pytest.raises(ConnectionError, match="Ollama connection failed"):
+        async for _ in generator:
+            pass
 
-    async def run_test():
-        mock_conv_manager = MagicMock()
-        tool_calls = [{"function": {"name": "failing_tool", "arguments": {}}}]
 
-        with patch(
-            "src.agent.my_local_agent.route.tracer.start_as_current_span"
-        ) as mock_span:
-            mock_span_instance = MagicMock()
-            mock_span_instance.__enter__ = MagicMock(return_value=mock_span_instance)
-            mock_span_instance.__exit__ = MagicMock(return_value=None)
-            mock_span.return_value = mock_span_instance
+# Registry entry returned for tools that exist
+REGISTERED_TOOL = SimpleNamespace(
+    current_version="1.0",
+    category="test",
+    status=SimpleNamespace(value="active"),
+    call_count=5,
+    average_execution_time_ms=100,
+)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "tool_calls, registry_setup, expected",
+    [
+        # Missing 'name' field is skipped gracefully
+        pytest.param([{"function": {}}], {}, None, id="missing_tool_name"),
+        # Tool not in registry yields tool_error
+        pytest.param(
+            [{"function": {"name": "nonexistent_tool", "arguments": {}}}],
+            {"tool": None},
+            {"stage": "tool_error", "error": "not found in registry"},
+            id="tool_not_found",
+        ),
+        # Execution failure yields tool_error
+        pytest.param(
+            [{"function": {"name": "failing_tool", "arguments": {}}}],
+            {
+                "tool": REGISTERED_TOOL,
+                "side_effect": Exception("Tool execution failed"),
+            },
+            {"stage": "tool_error", "error": "Tool execution failed"},
+            id="execution_error",
+        ),
+        # Successful execution yields tool_result
+        pytest.param(
+            [{"function": {"name": "working_tool", "arguments": {"param": "value"}}}],
+            {"tool": REGISTERED_TOOL, "return_value": "tool result"},
+            {"stage": "tool_result", "tool": "working_tool", "result": "tool result"},
+            id="successful_execution",
+        ),
+    ],
+)
+async def test_execute_tools(
+    mock_tracer_span, fake_tool_registry, tool_calls, registry_setup, expected
+):
+    """Test tool execution outcomes for each registry scenario."""
 
-            with patch("src.agent.my_local_agent.route.tool_registry") as mock_registry:
-                mock_tool = MagicMock()
-                mock_tool.current_version = "1.0"
-                mock_tool.category = "test"
-                mock_tool.status.value = "active"
-                mock_tool.call_count = 5
-                mock_tool.average_execution_time_ms = 100
-                mock_registry.get_tool_by_function_name.return_value = mock_tool
-                mock_registry.execute_tool_by_function_name.side_effect = Exception(
-                    "Tool execution failed"
-                )
+    def execute_tool_by_function_name(name, **kwargs):
+        if "side_effect" in registry_setup:
+            raise registry_setup["side_effect"]
+        return registry_setup.get("return_value")
 
-                generator = _execute_tools(tool_calls, mock_conv_manager)
+    fake_tool_registry.get_tool_by_function_name = lambda name: registry_setup.get(
+        "tool"
+    )
+    fake_tool_registry.execute_tool_by_function_name = execute_tool_by_function_name
 
-                results = []
-                async for result in generator:
-                    results.append(result)
+    results = [result async for result in _execute_tools(tool_calls, MagicMock())]
 
-                # Should yield tool_error for execution failure
-                assert len(results) == 1
-                assert results[0]["stage"] == "tool_error"
-                assert "Tool execution failed" in results[0]["error"]
+    if expected is None:
+        assert results == []
+        return
 
-    anyio.run(run_test)
+    assert len(results) == 1
+    assert results[0]["stage"] == expected["stage"]
+    if expected["stage"] == "tool_error":
+        assert expected["error"] in results[0]["error"]
+    else:
+        assert results[0]["tool"] == expected["tool"]
+        assert results[0]["result"] == expected["result"]
 
 
-def test_execute_tools_successful_execution():
-    """Test successful tool execution path."""
+@pytest.mark.anyio
+async def test_execute_tools_runs_calls_concurrently(
+    mock_tracer_span, fake_tool_registry
+):
+    """Test tool calls from one turn overlap and stream as they finish."""
+    # Only passes once both calls are running at the same time
+    barrier = threading.Barrier(2, timeout=5)
+
+    def execute_tool_by_function_name(name, **kwargs):
+        barrier.wait()
+        if name == "slow_tool":
+            time.sleep(0.05)
+        return name
+
+    fake_tool_registry.get_tool_by_function_name = lambda name: REGISTERED_TOOL
+    fake_tool_registry.execute_tool_by_function_name = execute_tool_by_function_name
+    tool_calls = [
+        {"function": {"name": name, "arguments": {}}}
+        for name in ("slow_tool", "fast_tool")
+    ]
+    conv_manager = MagicMock()
+
+    results = [result async for result in _execute_tools(tool_calls, conv_manager)]
+
+    assert [result["tool"] for result in results] == ["fast_tool", "slow_tool"]
+    # Persisted in the order the model emitted the calls
+    assert [
+        call.kwargs["tool_name"]
+        for call in conv_manager.add_tool_message.call_args_list
+    ] == ["slow_tool", "fast_tool"]
+
+
+@pytest.mark.anyio
+async def test_stream_chat_with_tools_model_error():
+    """Test chat orchestration with model streaming error."""
+    mock_conv_manager = MagicMock()
+    mock_conv_manager.get_current_conversation.return_value = SimpleNamespace(
+        id=1, model="test-model", messages=[]
+    )
 
-    async def run_test():
-        mock_conv_manager = MagicMock()
-        tool_calls = [
-            {"function": {"name": "working_tool", "arguments": {"param": "value"}}}
-        ]
+    with patch("src.agent.my_local_agent.route._stream_model_response") as mock_stream:
+        mock_stream.side_effect = RuntimeError("Model streaming error")
 
-        with patch(
-            "src.agent.my_local_agent.route.tracer.start_as_current_span"
-        ) as mock_span:
-            mock_span_instance = MagicMock()
-            mock_span_instance.__enter__ = MagicMock(return_value=mock_span_instance)
-            mock_span_instance.__exit__ = MagicMock(return_value=None)
-            mock_span.return_value = mock_span_instance
+        parent_ctx = MagicMock()
+        generator = _stream_chat_with_tools_refactored(
+            "test-model", mock_conv_manager, parent_ctx
+        )
 
-            with patch("src.agent.my_local_agent.route.tool_registry") as mock_registry:
-                mock_tool = MagicMock()
-                mock_tool.current_version = "1.0"
-                mock_tool.category = "test"
-                mock_tool.status.value = "active"
-                mock_tool.call_count = 5
-                mock_tool.average_execution_time_ms = 100
-                mock_registry.get_tool_by_function_name.return_value = mock_tool
-                mock_registry.execute_tool_by_function_name.return_value = "tool result"
+        results = []
+        with pytest.raises(RuntimeError, match="Model streaming error"):
+            async for result in generator:
+                results.append(result)
 
-                generator = _execute_tools(tool_calls, mock_conv_manager)
 
-                results = []
-                async for result in generator:
-                    results.append(result)
+@pytest.mark.anyio
+@pytest.mark.parametrize("model", ["gpt-oss:20b", "test-model"])
+async def test_stream_chat_with_tools_model_config(model):
+    """Test the per-model tools and thinking effort come from MODEL_CONFIG."""
+    mock_conv_manager = MagicMock()
+    mock_conv_manager.get_current_conversation.return_value = SimpleNamespace(
+        id=1, model=model, messages=[]
+    )
 
-                # Should yield successful tool result
-                assert len(results) == 1
-                assert results[0]["stage"] == "tool_result"
-                assert results[0]["tool"] == "working_tool"
-                assert results[0]["result"] == "tool result"
+    with patch("src.agent.my_local_agent.route._stream_model_response") as mock_stream:
+        mock_stream.return_value = replay([])
+        async for _ in _stream_chat_with_tools_refactored(
+            model, mock_conv_manager, MagicMock()
+        ):
+            pass
 
-    anyio.run(run_test)
+    _, _, think, tools = mock_stream.call_args.args
+    expected_tools, expected_think = MODEL_CONFIG.get(model, (None, None))
+    assert think == expected_think
+    assert tools is expected_tools
 
 
-def test_stream_chat_with_tools_model_error():
-    """Test chat orchestration with model streaming error."""
+@pytest.mark.anyio
+async def test_stream_chat_with_tools_yields_bytes():
+    """Test every streamed line is ready-encoded NDJSON bytes."""
+    mock_conv_manager = MagicMock()
+    mock_conv_manager.get_current_conversation.return_value = SimpleNamespace(
+        id=1, model="test-model", messages=[]
+    )
 
-    async def run_test():
-        mock_conv_manager = MagicMock()
-        mock_conv_manager.get_current_conversation.return_value = MagicMock(
-            id=1, messages=[]
+    with patch("src.agent.my_local_agent.route._stream_model_response") as mock_stream:
+        mock_stream.return_value = replay(
+            [
+                {"stage": "thinking", "response": "thinking..."},
+                {"stage": "content", "response": 'café "quoted"\n'},
+            ]
         )
-
-        with patch(
-            "src.agent.my_local_agent.route._stream_model_response"
-        ) as mock_stream:
-            mock_stream.side_effect = Exception("Model streaming error")
-
-            parent_ctx = MagicMock()
-            generator = _stream_chat_with_tools_refactored(
-                "test-model", mock_conv_manager, parent_ctx
+        lines = [
+            line
+            async for line in _stream_chat_with_tools_refactored(
+                "test-model", mock_conv_manager, MagicMock()
             )
+        ]
 
-            results = []
-            with pytest.raises(Exception):
-                async for result in generator:
-                    results.append(result)
-
-    anyio.run(run_test)
+    assert all(type(line) is bytes and line.endswith(b"\n") for line in lines)
+    # The templated token events match the generic encoder byte for byte
+    assert lines[1:3] == [
+        encode_event({"stage": "thinking", "response": "thinking..."}),
+        encode_event({"stage": "content", "response": 'café "quoted"\n'}),
+    ]
+    assert [orjson.loads(line)["stage"] for line in lines] == [
+        "metadata",
+        "thinking",
+        "content",
+        "finalize_answer",
+    ]
+
+
+@pytest.mark.anyio
+async def test_stream_chat_with_tools_iteration_error():
+    """Test error in chat loop iteration."""
+    mock_conv_manager = MagicMock()
+    mock_conv_manager.get_current_conversation.return_value = SimpleNamespace(
+        id=1, model="test-model", messages=[]
+    )
 
+    async def failing_stream():
+        yield {"stage": "content", "response": "test"}
+        raise Exception("Stream iteration error")
 
-def test_stream_chat_with_tools_iteration_error():
-    """Test error in chat loop iteration."""
+    with patch("src.agent.my_local_agent.route._stream_model_response") as mock_stream:
+        mock_stream.return_value = failing_stream()
 
-    async def run_test():
-        mock_conv_manager = MagicMock()
-        mock_conv_manager.get_current_conversation.return_value = MagicMock(
-            id=1, messages=[]
+        parent_ctx = MagicMock()
+        generator = _stream_chat_with_tools_refactored(
+            "test-model", mock_conv_manager, parent_ctx
         )
 
-        async def failing_stream():
-            yield {"stage": "content", "response": "test"}
-            raise Exception("Stream iteration error")
+        stages = Counter()
+        try:
+            async for result in generator:
+                if isinstance(result, bytes):
+                    stages[orjson.loads(result).get("stage")] += 1
+        except Exception:
+            pass
 
-        with patch(
-            "src.agent.my_local_agent.route._stream_model_response"
-        ) as mock_stream:
-            mock_stream.return_value = failing_stream()
+        # Should contain error response
+        assert stages["error"] > 0
 
-            parent_ctx = MagicMock()
-            generator = _stream_chat_with_tools_refactored(
-                "test-model", mock_conv_manager, parent_ctx
-            )
 
-            results = []
-            try:
-                async for result in generator:
-                    if isinstance(result, str):
-                        parsed = json.loads(result.strip())
-                        results.append(parsed)
-            except Exception:
-                pass
+def invoke_payload(conversation_id, model="test-model", with_message=True):
+    """Build an /invoke body from the request model and encode it as JSON."""
+    messages = (
+        [ChatMessage(role=Role.USER, content="test", model=model)]
+        if with_message
+        else []
+    )
+    conversation = Conversation(
+        id=conversation_id, title="Test", model=model, messages=messages
+    )
+    return orjson.dumps(conversation.to_dict())
 
-            # Should contain error response
-            error_responses = [r for r in results if r.get("stage") == "error"]
-            assert len(error_responses) > 0
 
-    anyio.run(run_test)
+# /invoke request bodies, built once and posted as raw JSON
+JSON_HEADERS = {"content-type": "application/json"}
+EMPTY_MESSAGES_PAYLOAD = invoke_payload(0, with_message=False)
+MISSING_CONVERSATION_PAYLOAD = invoke_payload(999)
+NEW_CONVERSATION_PAYLOAD = invoke_payload(0)
+# Model that supports thinking
+THINKING_MODEL_PAYLOAD = invoke_payload(0, model="gpt-oss:20b")
 
 
-def test_invoke_no_messages_error(test_client):
+@pytest.mark.anyio
+async def test_invoke_no_messages_error(async_client):
     """Test invoke endpoint with no messages."""
-    payload = {"id": 0, "title": "Test", "model": "test-model", "messages": []}
-
-    response = test_client.post("/invoke", json=payload)
+    response = await async_client.post(
+        "/invoke", content=EMPTY_MESSAGES_PAYLOAD, headers=JSON_HEADERS
+    )
     assert response.status_code == 400
     assert "Query contains no messages" in response.json()["detail"]
 
 
-def test_invoke_conversation_not_found(test_client):
+@pytest.mark.anyio
+async def test_invoke_conversation_not_found(async_client):
     """Test invoke endpoint with non-existent conversation ID."""
     with patch(
         "src.agent.my_local_agent.route.ConversationManager.load_existing"
     ) as mock_load:
         mock_load.return_value = None
 
-        payload = {
-            "id": 999,
-            "title": "Test",
-            "model": "test-model",
-            "messages": [{"role": "user", "content": "test", "model": "test-model"}],
-        }
-
-        response = test_client.post("/invoke", json=payload)
+        response = await async_client.post(
+            "/invoke", content=MISSING_CONVERSATION_PAYLOAD, headers=JSON_HEADERS
+        )
         assert response.status_code == 404
         assert "Conversation not found" in response.json()["detail"]
 
 
+@pytest.mark.anyio
 @patch("src.agent.my_local_agent.route._stream_chat_with_tools_refactored")
-def test_invoke_streaming_response_error(
-    mock_stream, test_client, mock_conversation_manager
+async def test_invoke_streaming_response_error(
+    mock_stream, async_client, mock_conversation_manager
 ):
     """Test invoke endpoint streaming response creation error."""
     mock_stream.side_effect = Exception("Streaming error")
 
-    payload = {
-        "id": 0,
-        "title": "Test",
-        "model": "test-model",
-        "messages": [{"role": "user", "content": "test", "model": "test-model"}],
-    }
-
-    response = test_client.post("/invoke", json=payload)
-    assert response.status_code == 200
+    async with async_client.stream(
+        "POST", "/invoke", content=NEW_CONVERSATION_PAYLOAD, headers=JSON_HEADERS
+    ) as response:
+        assert response.status_code == 200
 
-    # Should return error response in streaming format
-    response_text = response.text
+        # Should return error response in streaming format
+        response_text = (await response.aread()).decode()
     assert "Response creation error" in response_text
 
 
-def test_invoke_with_thinking_model(test_client, mock_conversation_manager):
+@pytest.mark.anyio
+async def test_invoke_with_thinking_model(async_client, mock_conversation_manager):
     """Test invoke with thinking effort for specific model."""
     with patch(
         "src.agent.my_local_agent.route._stream_chat_with_tools_refactored"
     ) as mock_stream:
 
         async def mock_generator(*args, **kwargs):
-            yield json.dumps({"stage": "metadata", "conversation_id": 1}) + "\n"
-            yield json.dumps({"stage": "thinking", "response": "thinking..."}) + "\n"
-            yield json.dumps({"stage": "content", "response": "response"}) + "\n"
+            yield orjson.dumps({"stage": "metadata", "conversation_id": 1}) + b"\n"
+            yield orjson.dumps({"stage": "thinking", "response": "thinking..."}) + b"\n"
+            yield orjson.dumps({"stage": "content", "response": "response"}) + b"\n"
 
         mock_stream.return_value = mock_generator()
 
-        payload = {
-            "id": 0,
-            "title": "Test",
-            "model": "gpt-oss:20b",  # Model that supports thinking
-            "messages": [{"role": "user", "content": "test", "model": "gpt-oss:20b"}],
-        }
-
-        response = test_client.post("/invoke", json=payload)
-        assert response.status_code == 200
-        assert "thinking" in response.text
+        async with async_client.stream(
+            "POST", "/invoke", content=THINKING_MODEL_PAYLOAD, headers=JSON_HEADERS
+        ) as response:
+            assert response.status_code == 200
+            stages = [
+                orjson.loads(line)["stage"]
+                async for line in response.aiter_lines()
+                if line
+            ]
+        assert "thinking" in stages
 
 
-def test_app_lifespan_startup_and_shutdown():
+@pytest.mark.anyio
+async def test_app_lifespan_startup_and_shutdown():
     """Test application lifespan startup and shutdown."""
     with patch("src.agent.my_local_agent.route.DatabaseManager") as mock_db:
         mock_db_instance = MagicMock()
         mock_db.return_value.__enter__ = MagicMock(return_value=mock_db_instance)
         mock_db.return_value.__exit__ = MagicMock(return_value=None)
 
-        # Test that we can create a test client (triggers lifespan)
-        with TestClient(app):
+        # Run only the lifespan, without an HTTP client around it
+        async with app.router.lifespan_context(app):
             # Verify database initialization was called during lifespan
             mock_db.assert_called_once()
             mock_db_instance.create_init_tables.assert_called_once()
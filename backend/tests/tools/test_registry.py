@@ -2,14 +2,38 @@
 Unit tests for tools/registry.py - Tool registry management.
 """
 
+import copy
 import pytest
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
 from datetime import datetime
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 from src.tools.registry import ToolRegistry
 from src.tools.models import Tool, ToolStatus
 
 
+class CountingDict(dict):
+    """dict that counts membership tests and key lookups."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lookups = Counter()
+
+    def __contains__(self, key):
+        self.lookups["contains"] += 1
+        return super().__contains__(key)
+
+    def __getitem__(self, key):
+        self.lookups["getitem"] += 1
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.lookups["get"] += 1
+        return super().get(key, default)
+
+
 @pytest.fixture
 def sample_tool():
     """Create a sample tool for testing."""
@@ -77,6 +101,10 @@ class TestToolRegistry:
         registry = ToolRegistry()
         assert registry.tools == {}
         assert registry.tool_categories == {}
+        assert registry.tools_by_function_name == {}
+        assert registry.result_cache == {}
+        assert registry.active_tools == {}
+        assert registry.enabled_tools_by_category == {}
 
     def test_register_tool(self, registry, sample_tool):
         """Test registering a tool."""
@@ -138,6 +166,34 @@ class TestToolRegistry:
         result = registry.get_tool_by_function_name("nonexistent_function")
         assert result is None
 
+    def test_get_tool_by_function_name_uses_index(self, registry, sample_tool):
+        """Test function-name lookups never scan the registered tools."""
+        registry.register_tool(sample_tool)
+
+        with patch.object(registry, "tools", MagicMock(wraps=registry.tools)) as tools:
+            assert registry.get_tool_by_function_name("sample_function") == sample_tool
+            assert registry.get_tool_by_function_name("missing") is None
+
+        assert tools.values.call_count == 0
+
+    def test_register_tool_replaces_function_index_entry(self, registry, sample_tool):
+        """Test re-registering a tool name drops its old function name."""
+
+        def replacement_function(x: int, y: int) -> int:
+            return x * y
+
+        registry.register_tool(sample_tool)
+        replacement = Tool(
+            name=sample_tool.name,
+            description="Replacement",
+            function=replacement_function,
+            category=sample_tool.category,
+        )
+        registry.register_tool(replacement)
+
+        assert registry.get_tool_by_function_name("sample_function") is None
+        assert registry.get_tool_by_function_name("replacement_function") is replacement
+
     def test_execute_tool_success(self, registry, sample_tool):
         """Test successful tool execution."""
         registry.register_tool(sample_tool)
@@ -151,6 +207,19 @@ class TestToolRegistry:
         ):
             registry.execute_tool("nonexistent_tool")
 
+    def test_execute_tool_single_lookup(self, registry, sample_tool):
+        """Test execute_tool probes the tools dict exactly once."""
+        registry.register_tool(sample_tool)
+        registry.tools = CountingDict(registry.tools)
+
+        assert registry.execute_tool("sample_tool", 3, 5) == 8
+        assert registry.tools.lookups == {"get": 1}
+
+        registry.tools.lookups.clear()
+        with pytest.raises(ValueError):
+            registry.execute_tool("nonexistent_tool")
+        assert registry.tools.lookups == {"get": 1}
+
     def test_execute_tool_disabled(self, registry, disabled_tool):
         """Test executing a disabled tool raises ValueError."""
         registry.register_tool(disabled_tool)
@@ -179,6 +248,155 @@ class TestToolRegistry:
         ):
             registry.execute_tool_by_function_name("disabled_function")
 
+    def test_execute_tool_by_function_name_caches_within_ttl(self, registry):
+        """Test a tool with a TTL reuses results for the same arguments."""
+        calls = []
+
+        def cached_function(city: str) -> str:
+            calls.append(city)
+            return f"{city}-{len(calls)}"
+
+        tool = Tool(
+            name="cached_tool",
+            description="Cached tool",
+            function=cached_function,
+            cache_ttl_seconds=60,
+        )
+        registry.register_tool(tool)
+
+        execute = registry.execute_tool_by_function_name
+        with patch("src.tools.registry.time.monotonic", return_value=100.0):
+            first = execute("cached_function", "A")
+            assert execute("cached_function", "A") == first
+            execute("cached_function", city="B")
+        assert calls == ["A", "B"]
+        # Cache hits are not counted as executions
+        assert tool.call_count == 2
+
+        # Expired entries are executed again
+        with patch("src.tools.registry.time.monotonic", return_value=160.0):
+            assert execute("cached_function", "A") == "A-3"
+
+    def test_execute_tool_by_function_name_cache_concurrent(self, registry):
+        """Test concurrent cached calls with a full cache keep it consistent."""
+
+        def echo_function(value: int) -> int:
+            return value
+
+        registry.register_tool(
+            Tool(
+                name="echo_tool",
+                description="Echo tool",
+                function=echo_function,
+                cache_ttl_seconds=60,
+            )
+        )
+
+        with patch("src.tools.registry.RESULT_CACHE_MAX_ENTRIES", 8):
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                results = list(
+                    pool.map(
+                        lambda value: registry.execute_tool_by_function_name(
+                            "echo_function", value % 32
+                        ),
+                        range(400),
+                    )
+                )
+
+        assert results == [value % 32 for value in range(400)]
+        assert len(registry.result_cache) <= 8
+        assert all(
+            cached[1] == key[1][0] for key, cached in registry.result_cache.items()
+        )
+
+    def test_result_cache_evicts_least_recently_used(self, registry):
+        """Test the cache stays at its cap by evicting the least recently used."""
+        calls = []
+
+        def echo_function(value: int) -> int:
+            calls.append(value)
+            return value
+
+        registry.register_tool(
+            Tool(
+                name="echo_tool",
+                description="Echo tool",
+                function=echo_function,
+                cache_ttl_seconds=60,
+            )
+        )
+
+        execute = registry.execute_tool_by_function_name
+        with patch("src.tools.registry.RESULT_CACHE_MAX_ENTRIES", 2):
+            execute("echo_function", 1)
+            execute("echo_function", 2)
+            execute("echo_function", 1)  # Hit; 2 is now least recently used
+            execute("echo_function", 3)
+            assert len(registry.result_cache) == 2
+            execute("echo_function", 1)
+            execute("echo_function", 2)
+
+        assert calls == [1, 2, 3, 2]
+
+    def test_execute_tool_uses_result_cache(self, registry):
+        """Test executing by tool name honours the tool's TTL too."""
+        calls = []
+
+        def cached_function(city: str) -> str:
+            calls.append(city)
+            return city
+
+        registry.register_tool(
+            Tool(
+                name="cached_tool",
+                description="Cached tool",
+                function=cached_function,
+                cache_ttl_seconds=60,
+            )
+        )
+
+        registry.execute_tool("cached_tool", "A")
+        registry.execute_tool_by_function_name("cached_function", "A")
+        assert calls == ["A"]
+
+    def test_execute_tool_by_function_name_without_ttl_not_cached(
+        self, registry, sample_tool
+    ):
+        """Test tools without a TTL run on every call."""
+        registry.register_tool(sample_tool)
+
+        registry.execute_tool_by_function_name("sample_function", 1, 2)
+        registry.execute_tool_by_function_name("sample_function", 1, 2)
+
+        assert sample_tool.call_count == 2
+        assert registry.result_cache == {}
+
+    def test_execute_tool_by_function_name_unhashable_args_not_cached(self, registry):
+        """Test unhashable arguments bypass the cache instead of failing."""
+
+        def list_function(values: list) -> int:
+            return sum(values)
+
+        tool = Tool(
+            name="list_tool",
+            description="List tool",
+            function=list_function,
+            cache_ttl_seconds=60,
+        )
+        registry.register_tool(tool)
+
+        assert registry.execute_tool_by_function_name("list_function", [1, 2]) == 3
+        assert registry.execute_tool_by_function_name("list_function", [1, 2]) == 3
+        assert tool.call_count == 2
+
+    def test_executed_tool_can_be_copied(self, registry, sample_tool):
+        """Test tools stay deep-copyable and asdict-able after executing."""
+        registry.register_tool(sample_tool)
+        registry.execute_tool("sample_tool", 1, 2)
+
+        assert copy.deepcopy(sample_tool).call_count == 1
+        assert asdict(sample_tool)["call_count"] == 1
+
     def test_get_tools_by_category(
         self, registry, sample_tool, experimental_tool, disabled_tool
     ):
@@ -234,6 +452,67 @@ class TestToolRegistry:
         assert experimental_tool not in active_tools
         assert disabled_tool not in active_tools
 
+    def test_status_queries_do_not_scan_tools(
+        self, registry, sample_tool, experimental_tool, disabled_tool
+    ):
+        """Test the status queries read the prebuilt buckets."""
+        for tool in (sample_tool, experimental_tool, disabled_tool):
+            registry.register_tool(tool)
+
+        with patch.object(registry, "tools", MagicMock(wraps=registry.tools)) as tools:
+            assert registry.get_active_tools() == [sample_tool]
+            assert registry.get_active_tools() == registry.get_active_tools()
+            assert registry.get_tools_by_category("experimental") == [experimental_tool]
+            assert registry.get_tools_by_category("utility") == []
+
+        assert tools.values.call_count == 0
+
+    def test_set_tool_status_moves_buckets(self, registry, sample_tool):
+        """Test status changes keep the active and category buckets in sync."""
+        registry.register_tool(sample_tool)
+
+        registry.set_tool_status("sample_tool", ToolStatus.DISABLED)
+        assert sample_tool.status == ToolStatus.DISABLED
+        assert registry.get_active_tools() == []
+        assert registry.get_tools_by_category("math") == []
+
+        registry.set_tool_status("sample_tool", ToolStatus.EXPERIMENTAL)
+        assert registry.get_active_tools() == []
+        assert registry.get_tools_by_category("math") == [sample_tool]
+
+        registry.set_tool_status("sample_tool", ToolStatus.ACTIVE)
+        assert registry.get_active_tools() == [sample_tool]
+        assert registry.get_tools_by_category("math") == [sample_tool]
+
+        with pytest.raises(ValueError, match="Tool 'missing' not found in registry"):
+            registry.set_tool_status("missing", ToolStatus.ACTIVE)
+
+    def test_set_tool_status_after_category_change(self, registry, sample_tool):
+        """Test a status change unfiles the tool from the category it was under."""
+        registry.register_tool(sample_tool)
+
+        sample_tool.category = "other"
+        registry.set_tool_status("sample_tool", ToolStatus.EXPERIMENTAL)
+
+        assert registry.get_tools_by_category("math") == []
+        assert registry.get_tools_by_category("other") == [sample_tool]
+        assert registry.get_tool_stats()["active_tools"] == 0
+
+    def test_register_tool_replaces_status_buckets(self, registry, sample_tool):
+        """Test re-registering a tool name does not leave the old tool listed."""
+        registry.register_tool(sample_tool)
+        replacement = Tool(
+            name=sample_tool.name,
+            description="Replacement",
+            function=sample_tool.function,
+            category="utility",
+        )
+        registry.register_tool(replacement)
+
+        assert registry.get_active_tools() == [replacement]
+        assert registry.get_tools_by_category("math") == []
+        assert registry.get_tools_by_category("utility") == [replacement]
+
     @patch("src.tools.registry.datetime")
     def test_get_tool_stats(
         self, mock_datetime, registry, sample_tool, experimental_tool, disabled_tool